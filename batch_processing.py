@@ -0,0 +1,249 @@
+# ---------------------------------------------------
+# PARALLEL BATCH PROCESSING OF ARCHIVED WORKBOOKS
+# ---------------------------------------------------
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from config import DATASETS, TLID_MAPPING, dataset_for_file, ensure_directories, output_dir, processing_cache_dir
+from excel_processing import process_excel_result
+from output_writers import atomic_output, resolve_sinks, run_sink, sink_job
+from processing_cache import cached_process_excel_result
+
+# ---------------------------------------------------
+# BATCH CONFIGURATION
+# ---------------------------------------------------
+WORKBOOK_PATTERNS = ('*.xls', '*.xlsx')
+LOG_TAIL_LINES = 20     # Lines of worker output kept for failed files
+# Sinks that accumulate history across workbooks; the per-file outputs (json,
+# csv, xlsx) are replaced by the combined CSV in a batch run
+BATCH_SINKS = ('parquet', 'sqlite')
+
+# ---------------------------------------------------
+# BATCH FUNCTIONS
+# ---------------------------------------------------
+
+def find_workbooks(directory, patterns=WORKBOOK_PATTERNS):
+    """List the workbooks in a directory, oldest name first"""
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(os.path.join(directory, pattern)))
+    # Skip Excel lock files such as '~$report.xlsx'
+    return sorted(f for f in files if not os.path.basename(f).startswith('~$'))
+
+def process_workbook_job(file_path, backfill=False, use_cache=True, mapping=None, period_rules=None,
+                         since_period=None):
+    """Process one workbook in a worker process; returns its result and timing.
+
+    mapping defaults to the 17-1 TLID mapping; other registered datasets pass their own.
+    """
+    started = time.perf_counter()
+    log = io.StringIO()
+    result = {'file': file_path, 'status': 'failed'}
+    mapping = mapping or TLID_MAPPING
+
+    try:
+        # Worker output is captured so parallel runs do not interleave on the console
+        with contextlib.redirect_stdout(log):
+            if use_cache:
+                mapped, metadata = cached_process_excel_result(file_path, mapping, processing_cache_dir,
+                                                               backfill=backfill, since_period=since_period,
+                                                               period_rules=period_rules)
+            else:
+                mapped, metadata = process_excel_result(file_path, mapping, backfill=backfill,
+                                                        since_period=since_period, period_rules=period_rules)
+
+        # The compact result crosses the process boundary instead of nested per-code dicts
+        if mapped and metadata:
+            result.update(status='success', mapped=mapped, metadata=metadata)
+        elif metadata and metadata.get('up_to_date'):
+            result.update(status='up_to_date', metadata=metadata)
+        else:
+            result['error'] = "Failed to process Excel file or apply mapping"
+    except Exception as e:
+        result['error'] = str(e)
+
+    if result['status'] == 'failed':
+        result['log_tail'] = log.getvalue().splitlines()[-LOG_TAIL_LINES:]
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+def combine_results(results):
+    """Merge per-file results into long-format records, one per (code, period).
+
+    Files are applied oldest name first, so a later workbook's revised value wins.
+    """
+    combined = {}
+    for result in sorted(results, key=lambda r: os.path.basename(r['file'])):
+        if result['status'] != 'success':
+            continue
+        mapping = result['mapped'].mapping
+        for tlid_code, period, value in result['mapped'].iter_values():
+            combined[(tlid_code, period)] = {
+                'tlid_code': tlid_code,
+                'english': mapping[tlid_code]['english'],
+                'chinese': mapping[tlid_code]['chinese'],
+                'period': period,
+                'value': value,
+                'source_file': os.path.basename(result['file'])
+            }
+
+    return sorted(combined.values(), key=lambda r: (r['period'], r['tlid_code']))
+
+def write_history_sinks(records, results, combined_name, sinks=None):
+    """Write a batch's history through the selected BATCH_SINKS, side by side.
+
+    The Parquet store takes the combined records in one upsert; SQLite records a
+    run per workbook, oldest name first, so the newest revision of a value wins.
+    Returns {sink: {'seconds', 'failed_files'}}.
+    """
+    succeeded = [r for r in sorted(results, key=lambda r: os.path.basename(r['file'])) if r['status'] == 'success']
+
+    def write_parquet():
+        job = dict(sink_job({}, {}, combined_name), history_records=records)
+        _, seconds, error = run_sink('parquet', job)
+        failed = [] if error is None else [{'file': os.path.basename(r['file']), 'error': str(error)}
+                                           for r in succeeded]
+        return {'seconds': seconds, 'failed_files': failed}
+
+    def write_sqlite():
+        entry = {'seconds': 0.0, 'failed_files': []}
+        for result in succeeded:
+            file_name = os.path.basename(result['file'])
+            _, seconds, error = run_sink('sqlite', sink_job(result['mapped'].to_mapped_data(), result['metadata'],
+                                                            file_name))
+            entry['seconds'] += seconds
+            if error is not None:
+                entry['failed_files'].append({'file': file_name, 'error': str(error)})
+        return entry
+
+    writers = {'parquet': write_parquet, 'sqlite': write_sqlite}
+    selected = [name for name in resolve_sinks(sinks) if name in BATCH_SINKS]
+    if not selected:
+        return {}
+
+    # Sink output is dropped for the whole block; redirect_stdout is not per thread
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=len(selected)) as executor:
+            futures = {name: executor.submit(writers[name]) for name in selected}
+            return {name: future.result() for name, future in futures.items()}
+
+def batch_process_directory(directory, workers=None, backfill=False, use_cache=True, sinks=None):
+    """Map every workbook in a directory on a process pool and write one combined output.
+
+    Each workbook is mapped with the mapping and period rules of its registered
+    dataset, found from its file name prefix.
+
+    The selected history sinks (parquet, sqlite; TLID_SINKS by default) then run
+    side by side, see write_history_sinks.
+    """
+    ensure_directories()
+    files = find_workbooks(directory)
+    if not files:
+        print(f"No workbooks found in {directory}")
+        return None
+
+    workers = workers or os.cpu_count() or 1
+    print(f"\n--- BATCH PROCESSING {len(files)} WORKBOOKS WITH {workers} WORKERS ---")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for f in files:
+            dataset = DATASETS[dataset_for_file(f)]
+            future = executor.submit(process_workbook_job, f, backfill, use_cache, dataset['mapping'],
+                                     dataset.get('period_rules'))
+            futures[future] = f
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result = {'file': futures[future], 'status': 'failed', 'error': str(e), 'seconds': 0.0}
+            results.append(result)
+
+            name = os.path.basename(result['file'])
+            if result['status'] == 'success':
+                cached = " (cached)" if result['metadata'].get('cache_hit') else ""
+                print(f"  ✓ {name}: {result['metadata']['successfully_mapped']} codes in {result['seconds']:.2f}s{cached}")
+            else:
+                print(f"  ✗ {name}: {result.get('error')} after {result['seconds']:.2f}s")
+    elapsed = time.perf_counter() - started
+
+    # Aggregate into one combined long-format output plus a run report
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    records = combine_results(results)
+    combined_path = os.path.join(output_dir, f"batch_{timestamp}_combined.csv")
+    with atomic_output(combined_path) as temp_path:
+        pd.DataFrame(records).to_csv(temp_path, index=False)
+
+    sink_report = write_history_sinks(records, results, os.path.basename(combined_path), sinks)
+
+    failures = [r for r in results if r['status'] != 'success']
+    report = {
+        'directory': os.path.abspath(directory),
+        'processing_date': datetime.now().isoformat(),
+        'workers': workers,
+        'backfill': backfill,
+        'files': len(files),
+        'succeeded': len(files) - len(failures),
+        'failed': len(failures),
+        'elapsed_seconds': round(elapsed, 3),
+        'combined_output': combined_path,
+        'sinks': {name: dict(entry, seconds=round(entry['seconds'], 3)) for name, entry in sink_report.items()},
+        'timings': {os.path.basename(r['file']): round(r['seconds'], 3) for r in results},
+        'failures': [{k: r.get(k) for k in ('file', 'error', 'log_tail')} for r in failures]
+    }
+    report_path = os.path.join(output_dir, f"batch_{timestamp}_report.json")
+    with atomic_output(report_path) as temp_path:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n--- BATCH SUMMARY ---")
+    print(f"Processed {report['succeeded']}/{report['files']} workbooks in {elapsed:.2f}s")
+    print(f"✓ Saved {len(records)} combined records to: {combined_path}")
+    for name, entry in sink_report.items():
+        if entry['failed_files']:
+            print(f"✗ {name} sink failed for {len(entry['failed_files'])} workbook(s): "
+                  f"{entry['failed_files'][0]['error']}")
+        else:
+            print(f"✓ Wrote {report['succeeded']} workbook(s) through the {name} sink in {entry['seconds']:.2f}s")
+    print(f"✓ Saved batch report to: {report_path}")
+    return report
+
+def report_exit_code(report):
+    """Process exit status of a batch run: 1 when no report was made, a workbook failed or a sink failed"""
+    if not report or report['failed']:
+        return 1
+    if any(entry['failed_files'] for entry in report['sinks'].values()):
+        return 1
+    return 0
+
+# ---------------------------------------------------
+# COMMAND LINE
+# ---------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the TLID mapping over a directory of workbooks")
+    parser.add_argument('directory', help="folder of archived 17-1_*.xls files")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--backfill', action='store_true', help="extract every period, not just the latest")
+    parser.add_argument('--no-cache', action='store_true', help="ignore the content-hash processing cache")
+    parser.add_argument('--sinks', default=None,
+                        help="comma-separated history outputs: parquet, sqlite or none (default: TLID_SINKS)")
+    args = parser.parse_args()
+
+    report = batch_process_directory(args.directory, args.workers, args.backfill, not args.no_cache, args.sinks)
+    return report_exit_code(report)
+
+if __name__ == "__main__":
+    raise SystemExit(main())
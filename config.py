@@ -0,0 +1,111 @@
+# ---------------------------------------------------
+# SHARED SCRAPER CONFIGURATION
+# ---------------------------------------------------
+import os
+
+from mapping_config import load_dataset_configs
+
+# ---------------------------------------------------
+# SCRIPT CONFIGURATION
+# ---------------------------------------------------
+TARGET_URL = os.environ.get("TLID_TARGET_URL", "https://www.tii.org.tw/tii/english/rd/importantIndices/")
+
+# "http" fetches the page and XLS without a browser, "selenium" drives Chrome
+FETCH_MODE = os.environ.get("TLID_FETCH_MODE", "http")
+# Retry with Selenium when the HTTP fetch fails (e.g. the link is rendered by script)
+SELENIUM_FALLBACK = os.environ.get("TLID_SELENIUM_FALLBACK", "0") == "1"
+# Extract every period column instead of only the latest one
+BACKFILL = os.environ.get("TLID_BACKFILL", "0") == "1"
+# Only extract and append periods newer than the dataset's stored watermark
+INCREMENTAL = os.environ.get("TLID_INCREMENTAL", "0") == "1"
+# Output sinks written for each run: json, csv, xlsx, parquet, sqlite (or none)
+OUTPUT_SINKS = [name.strip() for name in os.environ.get("TLID_SINKS", "json,csv,xlsx,parquet,sqlite").split(',')]
+# Seconds to wait for a clicked download to land in download_dir
+DOWNLOAD_TIMEOUT = 60
+# How the Selenium path gets the workbook: "download" clicks the link and waits for
+# Chrome's download, "memory" fetches the bytes inside the page and parses them in memory
+SELENIUM_CAPTURE = os.environ.get("TLID_SELENIUM_CAPTURE", "download")
+# Keep a copy of in-memory captures in download_dir, written once they are processed
+ARCHIVE_CAPTURES = os.environ.get("TLID_ARCHIVE_CAPTURES", "1") == "1"
+# Browser profile for the Selenium path: "lean" loads pages eagerly, blocks images,
+# fonts and CSS and reuses a profile directory; "default" is stock Chrome
+BROWSER_PROFILES = ('default', 'lean')
+CHROME_PROFILE = os.environ.get("TLID_CHROME_PROFILE", "default")
+# Seconds each browser step may wait for its condition, overridable as
+# TLID_STEP_BUDGETS="section_expand=8,link=15"
+STEP_BUDGETS = {'page': 20.0, 'section_header': 10.0, 'section_expand': 5.0, 'link': 10.0, 'link_clickable': 5.0}
+
+def parse_step_budgets(spec, budgets):
+    """Apply "name=seconds,..." overrides to budgets; malformed entries are reported and skipped"""
+    for item in filter(None, (item.strip() for item in spec.split(','))):
+        name, _, seconds = item.partition('=')
+        try:
+            value = float(seconds)
+            if not name.strip() or value <= 0:
+                raise ValueError
+        except ValueError:
+            print(f"⚠ Ignoring malformed TLID_STEP_BUDGETS entry {item!r} (expected name=seconds)")
+            continue
+        budgets[name.strip()] = value
+    return budgets
+
+parse_step_budgets(os.environ.get("TLID_STEP_BUDGETS", ""), STEP_BUDGETS)
+
+# --- Setup directories ---
+script_dir = os.path.abspath(os.path.dirname(__file__))
+download_dir = os.path.join(script_dir, "downloads")
+output_dir = os.path.join(script_dir, "processed_data")
+cache_dir = os.path.join(script_dir, "cache")
+validator_cache_path = os.path.join(cache_dir, "http_validators.json")
+processing_cache_dir = os.path.join(cache_dir, "processing")
+watermark_path = os.path.join(cache_dir, "watermarks.json")
+history_store_dir = os.path.join(script_dir, "history_store")
+database_path = os.path.join(output_dir, "tlid_history.db")
+mapping_dir = os.environ.get("TLID_MAPPING_DIR", os.path.join(script_dir, "mappings"))
+mapping_cache_dir = os.path.join(cache_dir, "mappings")
+chrome_profile_dir = os.path.join(cache_dir, "chrome-profile")
+daemon_authkey_path = os.path.join(cache_dir, "daemon_authkey")
+
+def ensure_directories():
+    """Create the working directories used by a run"""
+    for directory in [download_dir, output_dir, cache_dir]:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+# ---------------------------------------------------
+# DATASET REGISTRY
+# ---------------------------------------------------
+# One versioned mapping file per TII index workbook in mapping_dir gives the
+# page section that holds its link, the file name prefix used to find the
+# link, its TLID codes (bilingual labels and Excel pattern, in output order)
+# and the layout of its period header. Dropping another file there lets
+# `scrape-all` download and map that index too, without code edits.
+DATASETS = load_dataset_configs(mapping_dir)
+DEFAULT_DATASET = '17-1'
+
+# The 17-1 TLID mapping and its output column order
+TLID_MAPPING = DATASETS[DEFAULT_DATASET]['mapping']
+tlid_order = list(TLID_MAPPING)
+
+# Downloads in flight at once during a multi-dataset run
+DOWNLOAD_PARALLELISM = int(os.environ.get("TLID_DOWNLOAD_PARALLELISM", "4"))
+
+def resolve_datasets(names=None):
+    """Turn a list or comma-separated string of dataset names into registry order"""
+    if names is None:
+        return list(DATASETS)
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+
+    unknown = [name for name in names if name not in DATASETS]
+    if unknown:
+        raise ValueError(f"Unknown dataset(s): {', '.join(unknown)} (choose from {', '.join(DATASETS)})")
+    return [name for name in DATASETS if name in names]
+
+def dataset_for_file(filename):
+    """Registry name of the dataset a workbook belongs to, by file name prefix"""
+    base_name = os.path.basename(filename)
+    for name, dataset in DATASETS.items():
+        if base_name.startswith(dataset['file_prefix']):
+            return name
+    return DEFAULT_DATASET
@@ -0,0 +1,90 @@
+# ---------------------------------------------------
+# EVENT-DRIVEN DOWNLOAD COMPLETION DETECTION
+# ---------------------------------------------------
+import os
+import re
+import threading
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+# ---------------------------------------------------
+# WATCHER CONFIGURATION
+# ---------------------------------------------------
+MIN_DOWNLOAD_SIZE = 10000    # Bytes; anything smaller is treated as incomplete
+PARTIAL_SUFFIXES = ('.crdownload', '.part', '.tmp')
+
+# ---------------------------------------------------
+# WATCHER
+# ---------------------------------------------------
+
+class DownloadWatcher(FileSystemEventHandler):
+    """Wait for a specific file to land in a directory via filesystem events.
+
+    Browsers write to a temporary name and rename it when the download is
+    finished, so the final rename (or close) of the expected filename is the
+    completion signal. Chrome's "name (1).ext" duplicates are accepted too.
+    """
+
+    def __init__(self, download_dir, filename, expected_size=None, min_size=MIN_DOWNLOAD_SIZE):
+        super().__init__()
+        self.download_dir = download_dir
+        self.expected_size = expected_size
+        self.min_size = min_size
+
+        stem, ext = os.path.splitext(filename)
+        self.name_pattern = re.compile(rf'^{re.escape(stem)}(?: \(\d+\))?{re.escape(ext)}$')
+
+        self.path = None
+        self.existing = set()
+        self.done = threading.Event()
+        self.observer = Observer()
+
+    def start(self):
+        """Start watching; call before triggering the download to avoid missing the event"""
+        self.existing = set(os.listdir(self.download_dir))
+        self.observer.schedule(self, self.download_dir, recursive=False)
+        self.observer.start()
+        return self
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+    def on_moved(self, event):
+        self.check(event.dest_path)
+
+    def on_created(self, event):
+        self.check(event.src_path)
+
+    def on_closed(self, event):
+        self.check(event.src_path)
+
+    def check(self, path):
+        """Signal completion when path is the expected file and has its final size"""
+        if self.done.is_set() or not self.name_pattern.match(os.path.basename(path)):
+            return
+        if self.is_complete(path):
+            self.path = path
+            self.done.set()
+
+    def is_complete(self, path):
+        if not os.path.isfile(path) or any(os.path.exists(path + s) for s in PARTIAL_SUFFIXES):
+            return False
+
+        size = os.path.getsize(path)
+        if self.expected_size is not None:
+            return size == self.expected_size
+        return size >= self.min_size
+
+    def wait(self, timeout):
+        """Block until the download completes; returns its exact path or None on timeout"""
+        if self.done.wait(timeout):
+            return self.path
+
+        # Last look in case the file finished before the observer saw it
+        for name in os.listdir(self.download_dir):
+            path = os.path.join(self.download_dir, name)
+            if name not in self.existing and self.name_pattern.match(name) and self.is_complete(path):
+                return path
+        return None
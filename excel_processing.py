@@ -0,0 +1,801 @@
+# ---------------------------------------------------
+# SHARED EXCEL PROCESSING HELPERS
+# ---------------------------------------------------
+import io
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from mapped_result import MappedResult
+from mapping_config import compiled_mapping, normalize_label
+
+# ---------------------------------------------------
+# HEADER INDEX CONFIGURATION
+# ---------------------------------------------------
+# Period labels look like "2025/04", "2025-04" or a bare year such as "2024"
+MONTHLY_PERIOD_PATTERN = r'(?<!\d)((?:19|20)\d{2})\s*[/-]\s*(\d{1,2})(?!\d)'
+ANNUAL_PERIOD_PATTERN = r'^((?:19|20)\d{2})(?:\.0+)?$'
+
+HEADER_SCAN_ROWS = 6        # Period labels live in the top header block
+SAMPLE_ROW_START = 5        # Rows used to check that a period column holds numbers
+SAMPLE_ROW_END = 25
+MIN_NUMERIC_DENSITY = 0.5   # Share of sample rows that must be non-zero numbers
+
+# ---------------------------------------------------
+# WORKBOOK FORMAT DETECTION
+# ---------------------------------------------------
+# Leading bytes of each workbook container, mapped to the library that reads it
+EXCEL_SIGNATURES = [
+    (b'PK\x03\x04', 'xlsx'),                          # Office Open XML (zip)
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls')     # Legacy OLE2 compound document
+]
+
+READER_ENGINES = {
+    'xlsx': 'openpyxl',
+    'xls': 'xlrd'
+}
+
+# A workbook source is a file path or an in-memory io.BytesIO whose .name is the served file name
+
+def workbook_name(source):
+    """File name of a workbook path or in-memory buffer"""
+    return os.path.basename(getattr(source, 'name', source))
+
+def workbook_bytes(source):
+    """Whole content of a workbook path or in-memory buffer"""
+    if isinstance(source, io.BytesIO):
+        return source.getvalue()
+    with open(source, 'rb') as f:
+        return f.read()
+
+def sniff_excel_format(file_path):
+    """Return 'xlsx', 'xls' or None based on the file's magic bytes"""
+    if isinstance(file_path, io.BytesIO):
+        first_bytes = file_path.getvalue()[:8]
+    else:
+        with open(file_path, 'rb') as f:
+            first_bytes = f.read(8)
+
+    for signature, file_format in EXCEL_SIGNATURES:
+        if first_bytes.startswith(signature):
+            return file_format
+    return None
+
+# Streams that hold the workbook globals of a legacy .xls (BIFF8, then BIFF5)
+OLE2_WORKBOOK_STREAMS = ('Workbook', 'Book')
+BIFF_BOF_RECORDS = (b'\x09\x08', b'\x09\x04', b'\x09\x02', b'\x09\x00')
+XLSX_REQUIRED_PARTS = ('[Content_Types].xml', 'xl/workbook.xml')
+
+def validate_ole2_workbook(file_path):
+    """Walk the OLE2 header, FAT and directory and check the workbook stream starts with a BOF record"""
+    from xlrd import compdoc
+
+    mem = workbook_bytes(file_path)
+
+    log = io.StringIO()
+    try:
+        doc = compdoc.CompDoc(mem, logfile=log)
+    except Exception as e:
+        raise ValueError(f"damaged OLE2 container: {e}")
+
+    # Sector 0 follows the 512-byte header. Like xlrd, only warn about a short last
+    # sector: truncation is caught by the expected size and the stream checks below
+    sector_size = 1 << int.from_bytes(mem[30:32], 'little')
+    if (len(mem) - 512) % sector_size:
+        print(f"⚠ OLE2 container ends in a short sector ({len(mem)} bytes is not a whole number of "
+              f"{sector_size}-byte sectors)")
+
+    for stream_name in OLE2_WORKBOOK_STREAMS:
+        stream, base, size = doc.locate_named_stream(stream_name)
+        if stream is not None:
+            if stream[base:base + 2] not in BIFF_BOF_RECORDS:
+                raise ValueError(f"'{stream_name}' stream does not start with a BIFF BOF record")
+            return
+    raise ValueError("OLE2 container has no Workbook stream")
+
+def validate_xlsx_workbook(file_path):
+    """Check every member's CRC and that the core workbook parts exist"""
+    import zipfile
+
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            damaged = archive.testzip()
+            names = set(archive.namelist())
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"damaged ZIP container: {e}")
+
+    if damaged:
+        raise ValueError(f"ZIP member {damaged} fails its CRC check")
+    missing = [part for part in XLSX_REQUIRED_PARTS if part not in names]
+    if missing:
+        raise ValueError(f"ZIP container is missing {', '.join(missing)}")
+
+WORKBOOK_VALIDATORS = {
+    'xls': validate_ole2_workbook,
+    'xlsx': validate_xlsx_workbook
+}
+
+def validate_workbook(file_path, expected_size=None):
+    """Verify a downloaded or captured workbook end to end; returns its format or raises ValueError"""
+    size = len(file_path.getvalue()) if isinstance(file_path, io.BytesIO) else os.path.getsize(file_path)
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f"size is {size} bytes, expected {expected_size}")
+
+    file_format = sniff_excel_format(file_path)
+    if file_format is None:
+        raise ValueError("not an OLE2 or ZIP workbook")
+    WORKBOOK_VALIDATORS[file_format](file_path)
+    return file_format
+
+# ---------------------------------------------------
+# BOUNDED WORKBOOK READER
+# ---------------------------------------------------
+# Only the first sheet is read, and past the header block only the label
+# column and the columns carrying a period label are kept
+
+def iter_xls_rows(file_path, select):
+    """Yield the selected cells of each row of a legacy .xls; select(row) returns column numbers or None for all"""
+    import xlrd
+
+    if isinstance(file_path, io.BytesIO):
+        book = xlrd.open_workbook(file_contents=file_path.getvalue(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for row_idx in range(sheet.nrows):
+            columns = select(row_idx)
+            if columns is None:
+                columns = range(sheet.row_len(row_idx))
+            values = []
+            for col_idx in columns:
+                if col_idx >= sheet.row_len(row_idx):
+                    values.append(None)
+                    continue
+                cell_type = sheet.cell_type(row_idx, col_idx)
+                if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    values.append(None)
+                elif cell_type == xlrd.XL_CELL_DATE:
+                    values.append(xlrd.xldate_as_datetime(sheet.cell_value(row_idx, col_idx), book.datemode))
+                else:
+                    values.append(sheet.cell_value(row_idx, col_idx))
+            yield values
+    finally:
+        book.release_resources()
+
+def iter_xlsx_rows(file_path, select):
+    """Yield the selected cells of each row of an .xlsx, streamed in openpyxl read-only mode"""
+    import openpyxl
+
+    book = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = book.worksheets[0]
+        for row_idx, row in enumerate(sheet.iter_rows(values_only=True)):
+            columns = select(row_idx)
+            if columns is None:
+                yield list(row)
+            else:
+                yield [row[col_idx] if col_idx < len(row) else None for col_idx in columns]
+    finally:
+        book.close()
+
+ROW_READERS = {
+    'xlsx': iter_xlsx_rows,
+    'xls': iter_xls_rows
+}
+
+def read_workbook_region(file_path, file_format=None, header_rows=HEADER_SCAN_ROWS, label_column=0):
+    """Stream the parts of a workbook the mapping needs into compact typed columns.
+
+    Returns a dict with 'labels' (categorical label column), 'header' (the
+    coerced header block), 'values' (float64 block of every column that has a
+    period label, keyed by its sheet column number), 'coerced' (the coerced
+    (excel_row, column) cells) and the sheet 'shape'.
+    """
+    if file_format is None:
+        file_format = sniff_excel_format(file_path)
+
+    if file_format not in ROW_READERS:
+        raise ValueError(f"Not a recognised Excel file: {workbook_name(file_path)}")
+
+    print(f"Detected {file_format} workbook, streaming with {READER_ENGINES[file_format]}")
+
+    header_lines, labels, cells = [], [], []
+    selected = {'columns': None}
+
+    def select(row_idx):
+        # Whole rows for the header block, then only the label and period columns
+        return None if row_idx < header_rows else selected['columns']
+
+    def index_header():
+        width = max((len(line) for line in header_lines), default=0)
+        padded = [line + [None] * (width - len(line)) for line in header_lines]
+        header, mask = coerce_numeric_frame(pd.DataFrame(padded, columns=range(width), dtype=object))
+        selected['columns'] = [label_column] + sorted(parse_period_labels(header))
+        return header, mask
+
+    header = None
+    for row_idx, values in enumerate(ROW_READERS[file_format](file_path, select)):
+        if row_idx < header_rows:
+            header_lines.append(list(values))
+            labels.append(values[label_column] if label_column < len(values) else None)
+            if row_idx == header_rows - 1:
+                header, header_mask = index_header()
+        else:
+            labels.append(values[0])
+            cells.append(values[1:])
+
+    if header is None:  # Sheet shorter than the header block
+        header, header_mask = index_header()
+    period_columns = selected['columns'][1:]
+
+    # The period columns over every row, header rows included, so row numbers line up
+    head_cells = [[line[col] if col < len(line) else None for col in period_columns] for line in header_lines]
+    block = pd.DataFrame(head_cells + cells, columns=period_columns, dtype=object)
+    block, block_mask = coerce_numeric_frame(block)
+    values = block.apply(pd.to_numeric, errors='coerce').astype('float64')
+
+    text = [None if label is None or pd.isna(label) else str(label) for label in labels]
+
+    return {
+        'labels': pd.Series(text, dtype='category'),
+        'header': header,
+        'values': values,
+        'coerced': sorted(set(coerced_cells(header_mask)) | set(coerced_cells(block_mask))),
+        'shape': (len(labels), header.shape[1])
+    }
+
+# ---------------------------------------------------
+# NUMERIC COERCION FUNCTIONS
+# ---------------------------------------------------
+# Dashes used in the sheets to mean "nothing reported"
+ZERO_DASHES = '-‐‑‒–—―－'
+NUMBER_PATTERN = r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)'
+
+def coerce_numeric_frame(df):
+    """Convert number-like strings across the whole frame in one vectorized pass.
+
+    Handles thousands separators, full-width characters and spaces, accounting
+    negatives such as '(1,234)' and lone dashes meaning zero. Returns the coerced
+    frame and a boolean frame marking the cells that were converted.
+    """
+    shape = df.shape
+    flat = pd.Series(df.to_numpy(dtype=object).ravel())
+
+    # Only text cells go through .str, which fails on a block without any strings
+    is_text = flat.map(lambda value: isinstance(value, str)).astype(bool)
+    text = flat[is_text].astype(str).str.normalize('NFKC').str.strip()
+    cleaned = text.str.replace(r'[,\s]', '', regex=True)
+    cleaned = cleaned.str.replace(r'^\((.+)\)$', r'-\1', regex=True)
+
+    is_number = cleaned.str.fullmatch(NUMBER_PATTERN, na=False).astype(bool)
+    is_dash = cleaned.isin(list(ZERO_DASHES))
+
+    # float64 parsing keeps the full precision shown in the formula bar
+    numbers = pd.to_numeric(cleaned.where(is_number), errors='coerce')
+    numbers[is_dash] = 0.0
+    coerced = (is_number | is_dash).reindex(flat.index, fill_value=False)
+
+    flat = flat.where(~coerced, numbers.reindex(flat.index))
+    result = pd.DataFrame(flat.to_numpy(dtype=object).reshape(shape), index=df.index, columns=df.columns)
+    mask = pd.DataFrame(coerced.to_numpy().reshape(shape), index=df.index, columns=df.columns)
+    return result, mask
+
+def coerced_cells(mask):
+    """List the (excel_row, column) positions marked in a coercion mask"""
+    rows, cols = mask.to_numpy().nonzero()
+    return [(int(mask.index[r]) + 1, int(mask.columns[c])) for r, c in zip(rows, cols)]
+
+# ---------------------------------------------------
+# HEADER INDEX FUNCTIONS
+# ---------------------------------------------------
+
+def numeric_density(values, columns, start_row=SAMPLE_ROW_START, end_row=SAMPLE_ROW_END):
+    """Return the share of non-zero numeric cells in the sample rows of each column of a float block"""
+    if not columns:
+        return {}
+
+    sample = values.iloc[start_row:min(end_row, len(values))].reindex(columns=list(columns))
+    if sample.empty:
+        return {col: 0.0 for col in columns}
+
+    filled = sample.notna() & (sample != 0)
+    density = filled.sum() / len(sample)
+
+    return {col: float(density.iloc[pos]) for pos, col in enumerate(columns)}
+
+def parse_period_labels(header):
+    """Find the period label of each column in the header block; the label column is skipped"""
+    header = header.iloc[:, 1:]
+    width = header.shape[1]
+    if width == 0:
+        return {}
+
+    # One flat pass over the header block instead of a cell-by-cell scan
+    cells = pd.Series(header.to_numpy(dtype=object).ravel())
+    cells = cells[cells.notna()]
+    text = cells.astype(str).str.strip()
+
+    monthly = text.str.extract(MONTHLY_PERIOD_PATTERN)
+    annual = text.str.extract(ANNUAL_PERIOD_PATTERN)
+
+    entries = {}
+    for flat_pos in text.index:
+        row_idx, col_offset = divmod(int(flat_pos), width)
+        col_idx = col_offset + 1
+        if col_idx in entries:
+            continue  # First label found in a column wins
+
+        year, month = monthly.at[flat_pos, 0], monthly.at[flat_pos, 1]
+        if pd.notna(year) and 1 <= int(month) <= 12:
+            period, granularity = f"{year}-{int(month):02d}", 'month'
+        elif pd.notna(annual.at[flat_pos, 0]):
+            period, granularity = annual.at[flat_pos, 0], 'year'
+        else:
+            continue
+
+        entries[col_idx] = {
+            'period': period,
+            'granularity': granularity,
+            'column': col_idx,
+            'row': row_idx,
+            'label': text.at[flat_pos]
+        }
+
+    return entries
+
+def build_header_index(header, values, min_density=MIN_NUMERIC_DENSITY):
+    """Map every period label in the header block to its column, once per sheet"""
+    entries = parse_period_labels(header)
+
+    densities = numeric_density(values, sorted(entries))
+    for col_idx, entry in entries.items():
+        entry['numeric_density'] = densities.get(col_idx, 0.0)
+        entry['valid'] = entry['numeric_density'] >= min_density
+
+    ordered = [entries[col] for col in sorted(entries)]
+
+    # A period repeated across columns resolves to the rightmost valid one
+    columns = {}
+    for entry in ordered:
+        if entry['valid']:
+            columns[entry['period']] = entry['column']
+
+    latest_period, latest_column = select_latest_period(ordered)
+
+    return {
+        'entries': ordered,
+        'columns': columns,
+        'latest_period': latest_period,
+        'latest_column': latest_column
+    }
+
+def select_latest_period(entries):
+    """Pick the most recent valid period, preferring monthly over annual labels"""
+    for granularity in ('month', 'year'):
+        candidates = [e for e in entries if e['valid'] and e['granularity'] == granularity]
+        if candidates:
+            latest = max(candidates, key=lambda e: (e['period'], e['column']))
+            return latest['period'], latest['column']
+    return None, None
+
+def slice_header_index(header_index, since_period):
+    """Restrict a header index to periods newer than since_period (incremental runs).
+
+    Periods compare by (year, month) with a bare year as (year, 13), so after a
+    monthly watermark such as '2025-04' later months and the annual '2025' column count as new.
+    """
+    from watermarks import period_key
+
+    newer_than = period_key(since_period)
+    columns = {period: col for period, col in header_index['columns'].items() if period_key(period) > newer_than}
+    newer = [e for e in header_index['entries'] if e['valid'] and e['period'] in columns]
+    latest_period, latest_column = select_latest_period(newer)
+    return dict(header_index, columns=columns, latest_period=latest_period, latest_column=latest_column)
+
+def print_header_index(header_index):
+    """Print a short summary of the header index"""
+    entries = header_index['entries']
+    valid = [e for e in entries if e['valid']]
+    print(f"  Header index: {len(entries)} period labels, {len(valid)} with numeric data")
+
+    for entry in entries:
+        if not entry['valid']:
+            print(f"    ⚠ Col {entry['column']} found {entry['period']} but no valid numeric data")
+
+    if header_index['latest_period']:
+        print(f"  ✓ Selected latest period: {header_index['latest_period']} at column {header_index['latest_column']}")
+    else:
+        print("  ⚠ No period column with numeric data found")
+
+# ---------------------------------------------------
+# LABEL INDEX FUNCTIONS
+# ---------------------------------------------------
+
+def normalize_labels(series):
+    """Vectorized normalize_label over a column of raw cell values"""
+    text = series.where(series.notna(), '').astype(str)
+    return (text.str.replace('　', ' ', regex=False)
+                .str.lower()
+                .str.split()
+                .str.join(' '))
+
+def build_label_index(labels, mapping):
+    """Resolve every mapping pattern against the label column in a single pass"""
+    raw_labels = labels.astype(object)
+    labels = normalize_labels(raw_labels)
+    # The English label sits on the last line of the bilingual cell
+    english = normalize_labels(raw_labels.where(raw_labels.notna(), '').astype(str).str.split('\n').str[-1])
+
+    # Patterns were normalized and compiled once per mapping, not once per workbook
+    compiled = compiled_mapping(mapping)
+    codes, patterns, matcher = compiled['codes'], compiled['patterns'], compiled['matcher']
+
+    # English and Chinese patterns both count; a row found by both is listed once
+    pattern_codes = compiled['pattern_codes']
+    candidates = {code: [] for code in codes}
+    for row_idx, label in zip(labels.index, labels.values):
+        if not label:
+            continue
+        for code_idx in sorted({pattern_codes[pattern_id] for pattern_id in matcher.find_all(label)}):
+            candidates[codes[code_idx]].append(row_idx)
+
+    rows = {}
+    for code, pattern, chinese in zip(codes, patterns, compiled['chinese']):
+        rows[code] = pick_label_row(candidates[code], pattern, chinese, english, raw_labels)
+
+    return {
+        'labels': labels,
+        'candidates': candidates,
+        'rows': rows
+    }
+
+def pick_label_row(candidate_rows, pattern, chinese, english, raw_labels):
+    """Disambiguate candidate rows: exact English label, then Chinese label, then first hit"""
+    if not candidate_rows:
+        return None
+
+    def rank(row_idx):
+        exact_english = english.at[row_idx] == pattern
+        chinese_match = bool(chinese) and chinese in str(raw_labels.at[row_idx])
+        return (not exact_english, not chinese_match, row_idx)
+
+    return min(candidate_rows, key=rank)
+
+# ---------------------------------------------------
+# SHEET STRUCTURE FUNCTIONS
+# ---------------------------------------------------
+# Sub-items (Securities -> Stocks, Real Estates -> Investment, ...) are not
+# marked by indentation once a sheet is re-saved as .xlsx, but their values
+# add up to their parent row, which places them in the tree reliably
+MAX_CHILD_ROWS = 12         # Sub-item rows listed under one parent row
+SUM_TOLERANCE = 1e-9        # Relative tolerance of parent = sum of children
+
+def sums_match(total, parts):
+    return abs(total - parts) <= max(abs(total) * SUM_TOLERANCE, 1e-6)
+
+def tree_label(text):
+    """Normalized English part of a bilingual label: the lines after the Chinese one"""
+    lines = str(text).split('\n')
+    return normalize_label(' '.join(lines[1:]) if len(lines) > 1 else lines[0])
+
+def build_row_tree(labels, values, header_index):
+    """Build the sheet's row hierarchy from the latest period column.
+
+    Every labelled row below the period labels with a number in that column is a node. Walking bottom-up,
+    a node whose value equals the sum of the next free nodes (two or more)
+    becomes their parent, so nested sub-items are claimed before their
+    parents are considered. Returns parent/children links, the root rows and
+    a {label path: row} index.
+    """
+    column = header_index['latest_column']
+    column_values = values[column] if column in values else pd.Series(dtype='float64')
+    first_row = max((entry['row'] for entry in header_index['entries']), default=-1) + 1
+    nodes = [row for row, label in zip(labels.index, labels.values)
+             if row >= first_row and label is not None and not pd.isna(label)
+             and pd.notna(column_values.get(row))]
+    value = {row: float(column_values[row]) for row in nodes}
+    parent = {row: None for row in nodes}
+    children = {row: [] for row in nodes}
+
+    for i in range(len(nodes) - 1, -1, -1):
+        total = value[nodes[i]]
+        if total == 0:
+            continue
+        running, picked = 0.0, []
+        for row in nodes[i + 1:]:
+            if parent[row] is not None:
+                continue  # Already a sub-item of a later row
+            if len(picked) == MAX_CHILD_ROWS:
+                break
+            running += value[row]
+            picked.append(row)
+            if len(picked) >= 2 and sums_match(total, running):
+                for child in picked:
+                    parent[child] = nodes[i]
+                children[nodes[i]] = picked
+                break
+
+    label_of = {row: tree_label(labels.at[row]) for row in nodes}
+    path, by_path = {}, {}
+    for row in nodes:  # Parents come before their children
+        path[row] = (path[parent[row]] if parent[row] is not None else ()) + (label_of[row],)
+        by_path.setdefault(path[row], row)
+
+    return {
+        'labels': label_of,
+        'parent': parent,
+        'children': children,
+        'roots': [row for row in nodes if parent[row] is None],
+        'path': path,
+        'by_path': by_path
+    }
+
+def resolve_tree_paths(tree, mapping):
+    """Resolve each code by its path (declared parents, then its own pattern) in the row tree.
+
+    An exact path is a dict lookup; a pattern that only starts a longer label
+    is looked up among the rows under the same parent. Codes without a place
+    in the tree resolve to None.
+    """
+    compiled = compiled_mapping(mapping)
+    rows = {}
+    for code, pattern, parent_code in zip(compiled['codes'], compiled['patterns'], compiled['parents']):
+        if parent_code is None:
+            scope, siblings = (), tree['roots']
+        elif rows.get(parent_code) is not None:
+            scope, siblings = tree['path'][rows[parent_code]], tree['children'][rows[parent_code]]
+        else:
+            rows[code] = None
+            continue
+
+        row = tree['by_path'].get(scope + (pattern,))
+        if row is None:
+            row = next((r for r in siblings if tree['labels'][r].startswith(pattern)), None)
+        rows[code] = row
+    return rows
+
+def resolve_rows(label_index, tree, mapping):
+    """Prefer the tree path of each code, falling back to the ranked pattern match.
+
+    Returns (rows, resolved_by) with resolved_by[code] 'path', 'pattern' or None.
+    """
+    tree_rows = resolve_tree_paths(tree, mapping)
+    rows, resolved_by = {}, {}
+    for code in mapping:
+        if tree_rows.get(code) is not None:
+            rows[code], resolved_by[code] = tree_rows[code], 'path'
+        else:
+            rows[code] = label_index['rows'][code]
+            resolved_by[code] = 'pattern' if rows[code] is not None else None
+    return rows, resolved_by
+
+def check_total(tree, values, rows, mapping, header_index):
+    """Compare the total code's row with the sum of the top-level rows above it, for every period"""
+    total_code = compiled_mapping(mapping)['total_code']
+    total_row = rows.get(total_code) if total_code else None
+    if total_row is None:
+        return None
+
+    roots = [row for row in tree['roots'] if row < total_row]
+    periods = sorted(header_index['columns'])
+    mismatches, checked = {}, 0
+    for period in periods:
+        column = header_index['columns'][period]
+        total = values.at[total_row, column]
+        parts = values.loc[roots, column]
+        if pd.isna(total) or parts.isna().all():
+            continue
+        checked += 1
+        if not sums_match(float(total), float(parts.sum())):
+            mismatches[period] = round(float(total) - float(parts.sum()), 6)
+
+    return {
+        'total_code': total_code,
+        'excel_row': total_row + 1,
+        'summed_rows': [row + 1 for row in roots],
+        'periods_checked': checked,
+        'mismatches': mismatches
+    }
+
+def print_structure(tree, structure_check):
+    """Print the inferred sub-item groups and the result of the total check"""
+    groups = {row: kids for row, kids in tree['children'].items() if kids}
+    print(f"Row tree: {len(tree['roots'])} top-level rows, {len(groups)} with sub-items")
+    for row, kids in groups.items():
+        print(f"  Row {row + 1} '{tree['labels'][row]}' = sum of rows {[kid + 1 for kid in kids]}")
+
+    if structure_check is None:
+        return
+    if structure_check['mismatches']:
+        print(f"  ⚠ {structure_check['total_code']} differs from the sum of its top-level rows in "
+              f"{len(structure_check['mismatches'])} period(s): {structure_check['mismatches']}")
+    else:
+        print(f"  ✓ {structure_check['total_code']} equals the sum of its top-level rows "
+              f"in {structure_check['periods_checked']} period(s)")
+
+# ---------------------------------------------------
+# MAPPING PIPELINE
+# ---------------------------------------------------
+
+def extract_data_columns(values, row_index, header_index):
+    """Extract numerical data with full precision from the latest period column"""
+    if row_index is None:
+        return {}
+
+    # The period column comes from the header index built once per workbook
+    latest_period = header_index['latest_period']
+    amount_col_idx = header_index['latest_column']
+
+    if latest_period is None or amount_col_idx is None:
+        print(f"  ⚠ Could not find any period column for row {row_index + 1}")
+        return {}
+
+    row_data = {}
+
+    # The float64 block already holds the coerced numbers; anything else is NaN
+    raw_value = values.at[row_index, amount_col_idx] if amount_col_idx in values.columns else None
+    print(f"    Raw value at col {amount_col_idx}: {raw_value}")
+
+    if raw_value is not None and pd.notna(raw_value):
+        # Store the full precision number (as shown in formula bar)
+        row_data[f"{latest_period}_amount"] = float(raw_value)
+        print(f"    ✓ Extracted {latest_period}: {raw_value} (full precision: {float(raw_value)})")
+    else:
+        print(f"    ⚠ No data or NaN value at column {amount_col_idx}")
+
+    return row_data
+
+def extract_period_matrix(values, rows, header_index):
+    """Slice every valid period column for the matched rows into a (TLID x period) float matrix"""
+    found = {code: row for code, row in rows.items() if row is not None}
+    periods = sorted(header_index['columns'])
+    columns = [header_index['columns'][period] for period in periods]
+
+    # One block slice instead of per-cell reads
+    block = values.loc[list(found.values()), columns].to_numpy(dtype=float)
+    return pd.DataFrame(block, index=list(found), columns=periods)
+
+def process_excel_result(file_path, mapping, file_format=None, backfill=False, since_period=None,
+                         period_rules=None):
+    """Process a downloaded Excel file and apply the TLID mapping with full precision.
+
+    Returns (MappedResult, metadata), or (None, None) when the workbook cannot be read.
+    With backfill=True every period column is extracted, not just the latest one.
+    With since_period only the columns newer than that watermark are extracted; when
+    there are none the result is empty and metadata['up_to_date'] is True.
+    period_rules ('header_rows', 'min_numeric_density') override the header layout
+    defaults for datasets laid out differently from 17-1.
+    """
+    source = f"{workbook_name(file_path)} (in memory)" if isinstance(file_path, io.BytesIO) else file_path
+    print(f"\n--- PROCESSING EXCEL FILE: {source} ---")
+    period_rules = period_rules or {}
+    header_rows = period_rules.get('header_rows', HEADER_SCAN_ROWS)
+
+    try:
+        # Only the label column, header block and period columns are kept, as typed columns
+        region = read_workbook_region(file_path, file_format, header_rows)
+        n_rows, n_cols = region['shape']
+        print(f"SUCCESS: Loaded Excel file with {n_rows} rows and {n_cols} columns "
+              f"(kept the label column and {len(region['values'].columns)} period columns)")
+
+        # Number-like strings were coerced while reading, preserving precision
+        coerced_positions = region['coerced']
+        print(f"Coerced {len(coerced_positions)} text cells to numbers")
+
+        # Index the period header once for the whole workbook
+        header_index = build_header_index(region['header'], region['values'],
+                                          period_rules.get('min_numeric_density', MIN_NUMERIC_DENSITY))
+        print_header_index(header_index)
+
+        # Incremental runs only look at periods published after the watermark
+        if since_period is not None:
+            header_index = slice_header_index(header_index, since_period)
+            new_periods = sorted(header_index['columns'])
+            if not new_periods:
+                print(f"✓ No periods newer than {since_period}, nothing to extract")
+                return MappedResult(mapping, []), {
+                    'file_processed': workbook_name(file_path),
+                    'processing_date': datetime.now().isoformat(),
+                    'since_period': since_period,
+                    'up_to_date': True
+                }
+            print(f"  Incremental: {len(new_periods)} period(s) newer than {since_period}: {new_periods}")
+
+        # Resolve every TLID pattern against the label column in one pass
+        label_index = build_label_index(region['labels'], mapping)
+
+        # Place the rows in the sheet's hierarchy once, then resolve codes by path
+        tree = build_row_tree(region['labels'], region['values'], header_index)
+        rows, resolved_by = resolve_rows(label_index, tree, mapping)
+        structure_check = check_total(tree, region['values'], rows, mapping, header_index)
+        print_structure(tree, structure_check)
+
+        # Initialize results
+        metadata = {
+            'file_processed': workbook_name(file_path),
+            'processing_date': datetime.now().isoformat(),
+            'total_tlid_codes': len(mapping),
+            'successfully_mapped': 0,
+            'latest_period': header_index['latest_period'],
+            'period_columns': header_index['columns'],
+            'coerced_cells': coerced_positions,
+            'structure_check': structure_check,
+            'mapping_details': {}
+        }
+
+        # Backfill and incremental runs slice every selected period column at once
+        use_matrix = backfill or since_period is not None
+        if use_matrix:
+            matrix = extract_period_matrix(region['values'], rows, header_index)
+            metadata['periods'] = list(matrix.columns)
+            if backfill:
+                metadata['backfill'] = True
+            if since_period is not None:
+                metadata['since_period'] = since_period
+            print(f"Extracted {matrix.shape[0]} codes x {matrix.shape[1]} periods")
+
+        periods = metadata.get('periods') or ([header_index['latest_period']] if header_index['latest_period'] else [])
+        result = MappedResult(mapping, periods)
+
+        # Process each TLID code
+        print("\n--- APPLYING TLID MAPPING ---")
+        for tlid_code, mapping_info in mapping.items():
+            print(f"\nProcessing {tlid_code}...")
+            print(f"  Looking for: {mapping_info['excel_pattern']}")
+
+            # Find the row containing this investment type
+            row_index = rows[tlid_code]
+            candidates = label_index['candidates'][tlid_code]
+            if len(candidates) > 1:
+                print(f"  Candidate rows: {[row + 1 for row in candidates]}")
+
+            if row_index is not None:
+                print(f"  ✓ Found at row {row_index + 1} (by {resolved_by[tlid_code]})")
+
+                # Extract data from this row with full precision
+                if use_matrix:
+                    row_values = matrix.loc[tlid_code].to_numpy()
+                    result.values[result.code_index[tlid_code]] = row_values
+                    result.excel_rows[result.code_index[tlid_code]] = row_index + 1
+                    data_points = int(pd.notna(row_values).sum())
+                else:
+                    row_data = extract_data_columns(region['values'], row_index, header_index)
+                    result.set_code(tlid_code, row_index + 1, row_data)
+                    data_points = len(row_data)
+
+                if data_points:
+                    metadata['successfully_mapped'] += 1
+                    metadata['mapping_details'][tlid_code] = {
+                        'status': 'success',
+                        'excel_row': row_index + 1,
+                        'data_points': data_points,
+                        'resolved_by': resolved_by[tlid_code]
+                    }
+                    print(f"  ✓ Extracted {data_points} data points")
+                else:
+                    metadata['mapping_details'][tlid_code] = {
+                        'status': 'found_but_no_data',
+                        'excel_row': row_index + 1,
+                        'resolved_by': resolved_by[tlid_code]
+                    }
+                    print(f"  ⚠ Found row but no valid data extracted")
+            else:
+                metadata['mapping_details'][tlid_code] = {
+                    'status': 'not_found'
+                }
+                print(f"  ✗ Not found in Excel file")
+
+        return result, metadata
+
+    except Exception as e:
+        print(f"ERROR processing Excel file: {e}")
+        return None, None
+
+def process_excel_file(file_path, mapping, file_format=None, backfill=False, since_period=None, period_rules=None):
+    """process_excel_result expanded into the nested mapped_data layout used by the outputs"""
+    result, metadata = process_excel_result(file_path, mapping, file_format, backfill, since_period, period_rules)
+    if result is None:
+        return None, None
+    return result.to_mapped_data(), metadata
@@ -0,0 +1,168 @@
+# ---------------------------------------------------
+# PARTITIONED PARQUET HISTORY STORE
+# ---------------------------------------------------
+import contextlib
+import glob
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# ---------------------------------------------------
+# STORE CONFIGURATION
+# ---------------------------------------------------
+# One row per (tlid_code, period); labels repeat on every row, so they are dictionary-encoded
+HISTORY_SCHEMA = pa.schema([
+    pa.field('tlid_code', pa.dictionary(pa.int16(), pa.string()), nullable=False),
+    pa.field('english', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('chinese', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('period', pa.string(), nullable=False),
+    pa.field('value', pa.float64()),
+    pa.field('source_file', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('updated', pa.timestamp('s'))
+])
+KEY_COLUMNS = ['tlid_code', 'period']
+PARTITION_FILENAME = "part-0.parquet"
+LOCK_FILENAME = ".lock"
+
+_store_lock = threading.Lock()  # Serializes upserts between threads; the lock file covers processes
+
+# ---------------------------------------------------
+# STORE FUNCTIONS
+# ---------------------------------------------------
+
+def period_year(period):
+    """Partition key of a period label: '2025-04' and '2025' both live in year=2025"""
+    return int(str(period)[:4])
+
+def partition_path(store_dir, year):
+    return os.path.join(store_dir, f"year={year}", PARTITION_FILENAME)
+
+def records_to_table(records, source_file=None, updated=None):
+    """Build an Arrow table in the store schema from long-format history records.
+
+    A per-record 'source_file' (as in batch output) is kept unless source_file is given.
+    """
+    updated = (updated or datetime.now()).replace(microsecond=0)
+    frame = pd.DataFrame(records)
+    frame['period'] = frame['period'].astype(str)
+    if source_file is not None or 'source_file' not in frame:
+        frame['source_file'] = source_file
+    frame['updated'] = updated
+    frame = frame[HISTORY_SCHEMA.names]
+    return pa.Table.from_pandas(frame, schema=HISTORY_SCHEMA, preserve_index=False)
+
+@contextlib.contextmanager
+def store_lock(store_dir):
+    """Hold the store exclusively for a read-merge-replace, across threads and processes"""
+    os.makedirs(store_dir, exist_ok=True)
+    with _store_lock, open(os.path.join(store_dir, LOCK_FILENAME), 'a+b') as handle:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+def write_partition(table, path):
+    """Write one year partition atomically so readers never see a half-written file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pq.write_table(table, temp_path, compression='zstd')
+    os.replace(temp_path, path)
+
+def upsert_history(records, store_dir, source_file=None):
+    """Merge history records into the store, replacing existing (tlid_code, period) rows.
+
+    Only the year partitions touched by the records are read and rewritten, under
+    the store lock so concurrent writers never merge into a stale partition.
+    Returns the number of rows written per year.
+    """
+    if not records:
+        return {}
+
+    incoming = records_to_table(records, source_file).to_pandas()
+    incoming['year'] = incoming['period'].map(period_year)
+
+    with store_lock(store_dir):
+        return merge_partitions(incoming, store_dir)
+
+def merge_partitions(incoming, store_dir):
+    """Read, merge and replace each year partition touched by incoming rows"""
+    written = {}
+    for year, new_rows in incoming.groupby('year', sort=True):
+        path = partition_path(store_dir, year)
+        new_rows = new_rows.drop(columns='year')
+
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=HISTORY_SCHEMA).to_pandas()
+            merged = pd.concat([existing, new_rows], ignore_index=True)
+        else:
+            merged = new_rows
+
+        # Later rows win, so a re-processed or revised workbook replaces older values
+        merged = merged.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+        merged = merged.sort_values(KEY_COLUMNS, ignore_index=True)
+        write_partition(pa.Table.from_pandas(merged, schema=HISTORY_SCHEMA, preserve_index=False), path)
+        written[year] = len(new_rows)
+
+    return written
+
+def read_history(store_dir, start_period=None, end_period=None, codes=None):
+    """Load history rows for a period range and/or a subset of TLID codes.
+
+    Periods compare as strings ('2024' < '2024-01' < '2025'); a bare year as
+    end_period also covers that year's months. Only year partitions that can
+    overlap the range are opened.
+    """
+    columns = [field.name for field in HISTORY_SCHEMA]
+    paths = sorted(glob.glob(os.path.join(store_dir, "year=*", PARTITION_FILENAME)))
+
+    # Prune partitions by year before touching any file
+    first_year = period_year(start_period) if start_period else None
+    last_year = period_year(end_period) if end_period else None
+    selected = []
+    for path in paths:
+        year = int(os.path.basename(os.path.dirname(path)).split('=', 1)[1])
+        if (first_year is None or year >= first_year) and (last_year is None or year <= last_year):
+            selected.append(path)
+
+    if not selected:
+        return pd.DataFrame(columns=columns)
+
+    condition = None
+    if start_period:
+        condition = ds.field('period') >= str(start_period)
+    if end_period:
+        end_period = str(end_period)
+        if len(end_period) == 4:
+            end_period += "-12"
+        upper = ds.field('period') <= end_period
+        condition = upper if condition is None else condition & upper
+    if codes:
+        wanted = ds.field('tlid_code').isin(list(codes))
+        condition = wanted if condition is None else condition & wanted
+
+    dataset = ds.dataset(selected, schema=HISTORY_SCHEMA, format='parquet')
+    frame = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    return frame.sort_values(['period', 'tlid_code'], ignore_index=True)
+
+def latest_values(store_dir, codes=None):
+    """Most recent stored value per TLID code"""
+    history = read_history(store_dir, codes=codes)
+    if history.empty:
+        return history
+    return history.sort_values('period').groupby('tlid_code', observed=True).tail(1).reset_index(drop=True)
@@ -0,0 +1,364 @@
+# ---------------------------------------------------
+# BROWSERLESS HTTP FETCHING
+# ---------------------------------------------------
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urljoin
+
+import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import (DATASETS, DEFAULT_DATASET, DOWNLOAD_PARALLELISM, TARGET_URL, download_dir,
+                    validator_cache_path)
+from watermarks import dataset_name, get_watermark, is_published_after
+
+# ---------------------------------------------------
+# HTTP CONFIGURATION
+# ---------------------------------------------------
+REQUEST_TIMEOUT = 30          # Seconds per request (connect + read)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_ATTEMPTS = 5         # Transfers tried before a download gives up
+ATTEMPT_TIMEOUT = 120         # Seconds one transfer attempt may take in total
+BACKOFF_BASE = 0.5            # Seconds; the retry delay cap doubles per attempt
+BACKOFF_MAX = 8.0
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+def link_xpath_strategies(dataset):
+    """XPath strategies for a registered dataset's XLS link, tried in order (shared with the Selenium flow)"""
+    prefix = dataset['file_prefix']
+    strategies = [
+        f"//a[contains(@href, '{prefix}') and contains(@class, 'icon-file-xls')]",
+        f"//a[contains(@href, '{prefix}') and contains(@title, '.xls')]",
+        f"//a[contains(@href, '{prefix}')]"
+    ]
+    if dataset.get('link_title'):
+        strategies.append(f"//a[contains(@class, 'icon-file-xls') and contains(@title, '{dataset['link_title']}')]")
+    return strategies
+
+# XPath strategies for the 17-1 XLS link
+LINK_XPATH_STRATEGIES = link_xpath_strategies(DATASETS[DEFAULT_DATASET])
+
+# ---------------------------------------------------
+# HTTP FUNCTIONS
+# ---------------------------------------------------
+
+def create_session(pool_size=4, retries=3):
+    """Create a keep-alive session with a small connection pool and retries"""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                  allowed_methods=("GET", "HEAD"))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+def fetch_page(session, url, timeout=REQUEST_TIMEOUT):
+    """Fetch a page and return its HTML text"""
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+def find_xls_link(page_html, base_url, strategies=LINK_XPATH_STRATEGIES):
+    """Locate the XLS link in static HTML using the same XPath strategies as the browser flow.
+
+    Returns (absolute_href, strategy_number), or (None, None) when no strategy matches.
+    """
+    tree = lxml_html.fromstring(page_html)
+
+    for i, xpath in enumerate(strategies, 1):
+        print(f"  Trying strategy {i}: {xpath}")
+        for link in tree.xpath(xpath):
+            href = link.get('href')
+            if not href:
+                continue
+
+            href = urljoin(base_url, href)
+            class_name = link.get('class') or ""
+            print(f"    Found link: {href}")
+
+            if '.xls' in href.lower() or 'xls' in class_name.lower():
+                return href, i
+
+    return None, None
+
+# ---------------------------------------------------
+# RESUMABLE, VERIFIED DOWNLOADS
+# ---------------------------------------------------
+# Errors worth another attempt; anything else (404, 403, ...) fails at once
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    ValueError)
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Full-jitter exponential backoff: a random delay up to base * 2**attempt, capped"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def expected_total_size(response, offset):
+    """Full file size announced by a 200 or 206 response, or None"""
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None  # Lengths count the compressed bytes
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and content_range.rsplit('/', 1)[1].isdigit():
+        return int(content_range.rsplit('/', 1)[1])
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return int(content_length) + (offset if response.status_code == 206 else 0)
+    return None
+
+def append_body(response, part_path, mode, deadline, chunk_size, stats):
+    """Stream a body into the partial file, counting the bytes received in stats"""
+    with open(part_path, mode) as f:
+        for chunk in response.iter_content(chunk_size):
+            f.write(chunk)
+            stats['received_bytes'] += len(chunk)
+            if time.perf_counter() > deadline:
+                raise requests.Timeout(f"attempt exceeded {ATTEMPT_TIMEOUT}s")
+
+def resumable_download(session, url, dest_path, response=None, validators=None, expected_size=None,
+                       attempts=DOWNLOAD_ATTEMPTS, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Download a workbook to dest_path, resuming interrupted transfers with HTTP Range requests.
+
+    An already opened response is consumed as the first attempt. Later attempts
+    ask only for the missing bytes (If-Range keeps them from mixing two
+    versions of the file) and back off exponentially with jitter. The finished
+    file must match expected_size (or the announced size) and pass the OLE2/ZIP
+    structure check before it is renamed into place. Returns transfer stats.
+    """
+    from excel_processing import validate_workbook
+
+    part_path = dest_path + ".part"
+    if response is None and os.path.exists(part_path) and not (validators or {}).get('etag'):
+        os.remove(part_path)  # A leftover part cannot be proven to belong to this version
+    validator = (validators or {}).get('etag') or (validators or {}).get('last_modified')
+
+    started = time.perf_counter()
+    stats = {'bytes': None, 'received_bytes': 0, 'resumed_from': 0, 'attempts': 0}
+    for attempt in range(attempts):
+        offset = os.path.getsize(part_path) if response is None and os.path.exists(part_path) else 0
+        stats['attempts'] = attempt + 1
+        try:
+            if response is None:
+                headers = {}
+                if offset:
+                    headers['Range'] = f"bytes={offset}-"
+                    if validator:
+                        headers['If-Range'] = validator
+                response = session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+
+            with response:
+                if response.status_code != 416:  # 416: the part already holds every byte
+                    response.raise_for_status()
+                    resumed = response.status_code == 206
+                    if resumed and offset:
+                        stats['resumed_from'] = offset
+                        print(f"  Resuming {os.path.basename(dest_path)} at byte {offset}")
+                    expected_size = expected_size or expected_total_size(response, offset if resumed else 0)
+                    deadline = time.perf_counter() + ATTEMPT_TIMEOUT
+                    append_body(response, part_path, 'ab' if resumed else 'wb', deadline, chunk_size, stats)
+
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size < expected_size:
+                raise requests.exceptions.ChunkedEncodingError(f"transfer ended at {size} of {expected_size} bytes")
+            try:
+                validate_workbook(part_path, expected_size)
+            except ValueError:
+                os.remove(part_path)  # Damaged bytes cannot be resumed, start over
+                raise
+
+            os.replace(part_path, dest_path)
+            seconds = time.perf_counter() - started
+            stats.update(bytes=size, seconds=round(seconds, 3),
+                         bytes_per_sec=round(stats['received_bytes'] / seconds) if seconds > 0 else None)
+            print(f"  ✓ Verified {os.path.basename(dest_path)}: {size} bytes in {seconds:.2f}s "
+                  f"({(stats['bytes_per_sec'] or 0) / 1024:.0f} KiB/s, {attempt + 1} attempt(s))")
+            return stats
+
+        except RETRYABLE_ERRORS as e:
+            response = None
+            if attempt + 1 == attempts:
+                raise Exception(f"Download of {url} failed after {attempts} attempts: {e}")
+            delay = backoff_delay(attempt)
+            print(f"  ⚠ Attempt {attempt + 1} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+# ---------------------------------------------------
+# CONDITIONAL GET CACHE
+# ---------------------------------------------------
+
+def load_validator_cache(cache_path):
+    """Load the URL -> validators cache, or an empty one"""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Ignoring unreadable validator cache {cache_path}: {e}")
+        return {}
+
+def save_validator_cache(cache, cache_path):
+    """Write the validator cache atomically"""
+    temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+
+def response_validators(response):
+    """Extract ETag, Last-Modified and size from a response"""
+    content_length = response.headers.get('Content-Length')
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'content_length': int(content_length) if content_length and content_length.isdigit() else None
+    }
+
+def validators_match(cached, current):
+    """True when the cached and current validators describe the same file"""
+    if cached.get('etag') and current.get('etag'):
+        return cached['etag'] == current['etag']
+    if cached.get('last_modified') and current.get('last_modified'):
+        return (cached['last_modified'] == current['last_modified'] and
+                cached.get('content_length') == current.get('content_length'))
+    return False
+
+def conditional_download(session, url, dest_path, cached=None, timeout=REQUEST_TIMEOUT,
+                         chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Download url unless the server (304) or the cached validators show it is unchanged.
+
+    Returns (changed, validators). Nothing is written when changed is False.
+    """
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return False, cached
+
+        response.raise_for_status()
+        validators = response_validators(response)
+
+        # Servers that ignore conditional headers still expose unchanged metadata
+        if cached and validators_match(cached, validators):
+            return False, validators
+
+        validators['transfer'] = resumable_download(session, url, dest_path, response, validators,
+                                                    chunk_size=chunk_size)
+
+    return True, validators
+
+# ---------------------------------------------------
+# RUN HELPERS
+# ---------------------------------------------------
+
+def download_with_http(incremental=False, name=DEFAULT_DATASET):
+    """Fetch the page and one dataset's XLS (17-1 by default) over plain HTTP, without a browser.
+
+    Returns (file_path, cache_entry). The XLS is only downloaded when its ETag /
+    Last-Modified / size differ from the previous run; cache_entry['unchanged']
+    tells the caller it can reuse cache_entry['outputs'] instead. With
+    incremental=True a file whose name is not newer than the dataset watermark
+    is not downloaded at all (file_path is None, cache_entry['up_to_date'] is True).
+    """
+    # 1. FETCH THE PAGE
+    print(f"\nSTEP 1: Fetching the site over HTTP -> {TARGET_URL}")
+    session = create_session()
+    page_html = fetch_page(session, TARGET_URL)
+    print(f"SUCCESS: Fetched {len(page_html)} characters of HTML.")
+
+    return download_dataset(session, page_html, name, incremental)
+
+def download_dataset(session, page_html, name, incremental=False):
+    """Find a dataset's XLS link in an already fetched page and download it conditionally.
+
+    Returns (file_path, cache_entry) like download_with_http.
+    """
+    # 2. SEARCH THE STATIC HTML FOR THE DATASET'S XLS LINK
+    print(f"\nSTEP 2: Looking for {name} XLS download link...")
+    href, used_strategy = find_xls_link(page_html, TARGET_URL, link_xpath_strategies(DATASETS[name]))
+    if not href:
+        raise Exception(f"Could not find the {name} XLS download link using any strategy")
+
+    filename = href.split('/')[-1]
+    print(f"\nSTEP 3: Found target link using strategy {used_strategy}:")
+    print(f"  File: {filename}")
+    print(f"  Full URL: {href}")
+
+    if incremental:
+        watermark = get_watermark(dataset_name(filename))
+        if not is_published_after(filename, watermark):
+            print(f"SUCCESS: {filename} is not newer than the {watermark} watermark, nothing to download.")
+            return None, {'url': href, 'file_path': None, 'unchanged': True, 'up_to_date': True, 'outputs': []}
+
+    # 4. CONDITIONAL GET AGAINST THE PREVIOUS RUN
+    file_path = os.path.join(download_dir, filename)
+    cached = load_validator_cache(validator_cache_path).get(href)
+    if cached and not cached.get('succeeded', bool(cached['outputs'])):
+        cached = None  # The previous run did not save its outputs
+    if cached and not all(os.path.exists(p) for p in [cached['file_path']] + cached['outputs']):
+        cached = None  # Previous outputs are gone, so they cannot be reused
+
+    print(f"\nSTEP 4: Downloading {filename}...")
+    changed, validators = conditional_download(session, href, file_path, cached)
+
+    cache_entry = dict(validators or {}, url=href, file_path=file_path, unchanged=not changed,
+                       outputs=cached['outputs'] if cached and not changed else [])
+    if changed:
+        print(f"SUCCESS: Downloaded {filename}. File size: {os.path.getsize(file_path)} bytes")
+    else:
+        print(f"SUCCESS: {filename} not modified since the last run.")
+        cache_entry['file_path'] = cached['file_path']
+    return cache_entry['file_path'], cache_entry
+
+def download_datasets_with_http(names, incremental=False, max_parallel=DOWNLOAD_PARALLELISM):
+    """Fetch the page once, then download several datasets' XLS files concurrently.
+
+    Returns {name: (file_path, cache_entry)}; a dataset whose download failed maps
+    to the exception instead, so one missing link does not stop the others.
+    """
+    print(f"\nSTEP 1: Fetching the site over HTTP -> {TARGET_URL}")
+    session = create_session(pool_size=max_parallel)
+    page_html = fetch_page(session, TARGET_URL)
+    print(f"SUCCESS: Fetched {len(page_html)} characters of HTML.")
+
+    # The keep-alive pool is sized to the number of downloads in flight
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        futures = {name: executor.submit(download_dataset, session, page_html, name, incremental) for name in names}
+
+    downloads = {}
+    for name, future in futures.items():
+        try:
+            downloads[name] = future.result()
+        except Exception as e:
+            print(f"✗ {name} download failed: {e}")
+            downloads[name] = e
+    return downloads
+
+def remember_http_download(cache_entry, outputs):
+    """Record the validators and outputs of a successfully saved HTTP download for the next run.
+
+    outputs lists the files written; it is empty when only the parquet or
+    sqlite sinks ran, which still counts as a saved run.
+    """
+    cache = load_validator_cache(validator_cache_path)
+    cache[cache_entry['url']] = {
+        'etag': cache_entry.get('etag'),
+        'last_modified': cache_entry.get('last_modified'),
+        'content_length': cache_entry.get('content_length'),
+        'file_path': cache_entry['file_path'],
+        'outputs': outputs,
+        'succeeded': True,
+        'updated': datetime.now().isoformat()
+    }
+    save_validator_cache(cache, validator_cache_path)
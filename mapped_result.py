@@ -0,0 +1,97 @@
+# ---------------------------------------------------
+# COMPACT MAPPED RESULT
+# ---------------------------------------------------
+import numpy as np
+
+AMOUNT_SUFFIX = "_amount"
+# Label fields copied into each code's 'mapping_info'; structure keys such as
+# 'parent' and 'total' only steer row resolution and stay out of the output
+MAPPING_INFO_FIELDS = ('english', 'chinese', 'excel_pattern')
+
+# ---------------------------------------------------
+# RESULT TYPE
+# ---------------------------------------------------
+
+class MappedResult:
+    """Mapped values of one workbook as a (code x period) float64 matrix.
+
+    Rows follow the mapping's code order and columns the period list. The
+    mapping table is referenced, not copied. NaN marks a missing value and an
+    excel_row of 0 a code that has no data. to_mapped_data() rebuilds the
+    nested '<period>_amount' layout used by the JSON output.
+    """
+
+    __slots__ = ('mapping', 'codes', 'periods', 'values', 'excel_rows', 'code_index', 'period_index')
+
+    def __init__(self, mapping, periods, values=None, excel_rows=None):
+        self.mapping = mapping
+        self.codes = tuple(mapping)
+        self.periods = list(periods)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self.period_index = {period: j for j, period in enumerate(self.periods)}
+
+        shape = (len(self.codes), len(self.periods))
+        self.values = np.full(shape, np.nan) if values is None else np.asarray(values, dtype=np.float64).reshape(shape)
+        self.excel_rows = (np.zeros(len(self.codes), dtype=np.int32) if excel_rows is None
+                           else np.asarray(excel_rows, dtype=np.int32))
+
+    def __len__(self):
+        """Number of codes with at least one value"""
+        return int((~np.isnan(self.values)).any(axis=1).sum())
+
+    def set_code(self, tlid_code, excel_row, row_data):
+        """Store one code's extracted '<period>_amount' values"""
+        i = self.code_index[tlid_code]
+        self.excel_rows[i] = excel_row
+        for key, value in row_data.items():
+            self.values[i, self.period_index[key[:-len(AMOUNT_SUFFIX)]]] = value
+
+    def iter_values(self):
+        """Yield (tlid_code, period, value) for every stored value, code by code"""
+        rows, cols = np.nonzero(~np.isnan(self.values))
+        for i, j in zip(rows, cols):
+            yield self.codes[i], self.periods[j], float(self.values[i, j])
+
+    def to_mapped_data(self):
+        """Expand into the {code: {'mapping_info', 'data', 'excel_row'}} layout"""
+        mapped_data = {}
+        for i, code in enumerate(self.codes):
+            row = self.values[i]
+            present = np.flatnonzero(~np.isnan(row))
+            if not len(present):
+                continue
+            info = self.mapping[code]
+            mapped_data[code] = {
+                'mapping_info': {field: info[field] for field in MAPPING_INFO_FIELDS if field in info},
+                'data': {f"{self.periods[j]}{AMOUNT_SUFFIX}": float(row[j]) for j in present},
+                'excel_row': int(self.excel_rows[i])
+            }
+        return mapped_data
+
+    @classmethod
+    def from_mapped_data(cls, mapped_data, mapping):
+        """Build a compact result from the nested layout (the inverse of to_mapped_data)"""
+        periods = sorted({key[:-len(AMOUNT_SUFFIX)] for entry in mapped_data.values()
+                          for key in entry.get('data', {}) if key.endswith(AMOUNT_SUFFIX)})
+        result = cls(mapping, periods)
+        for code, entry in mapped_data.items():
+            result.set_code(code, entry.get('excel_row', 0), entry.get('data', {}))
+        return result
+
+    def to_dict(self):
+        """Compact JSON-safe form (no mapping copy, None for missing values)"""
+        return {
+            'codes': list(self.codes),
+            'periods': self.periods,
+            'values': [[None if np.isnan(v) else float(v) for v in row] for row in self.values],
+            'excel_rows': self.excel_rows.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, payload, mapping):
+        """Rebuild a result written by to_dict against the same mapping"""
+        if payload['codes'] != list(mapping):
+            raise ValueError("Stored result was mapped with a different code list")
+        values = np.array([[np.nan if v is None else v for v in row] for row in payload['values']],
+                          dtype=np.float64)
+        return cls(mapping, payload['periods'], values, payload['excel_rows'])
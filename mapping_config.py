@@ -0,0 +1,264 @@
+# ---------------------------------------------------
+# DECLARATIVE MAPPING CONFIGURATION
+# ---------------------------------------------------
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+
+# ---------------------------------------------------
+# CONFIGURATION FORMAT
+# ---------------------------------------------------
+# One file per dataset in the mappings directory, e.g. mappings/17-1.json:
+#   {"format_version": 1, "dataset": "17-1", "section": ..., "file_prefix": "17-1_",
+#    "link_title": ..., "period_rules": {...},
+#    "codes": [{"code": ..., "english": ..., "chinese": ..., "excel_pattern": ...}, ...]}
+# The order of "codes" is the column order of the TLID format output. A code may
+# name an earlier code as its "parent" (a sub-item row listed under it in the
+# sheet), and one code may be marked "total": the sum of the sheet's
+# top-level rows above it.
+MAPPING_FORMAT_VERSION = 1
+MAPPING_FILE_PATTERNS = ('*.json', '*.yaml', '*.yml')
+REQUIRED_DATASET_FIELDS = ('dataset', 'section', 'file_prefix', 'codes')
+REQUIRED_CODE_FIELDS = ('code', 'english', 'chinese', 'excel_pattern')
+PERIOD_RULE_TYPES = {'header_rows': int, 'min_numeric_density': (int, float)}
+
+# ---------------------------------------------------
+# LABEL MATCHING
+# ---------------------------------------------------
+
+def normalize_label(text):
+    """Lowercase a label and collapse newlines, full-width and repeated spaces"""
+    return ' '.join(str(text).replace('　', ' ').lower().split())
+
+class MultiPatternMatcher:
+    """Aho-Corasick automaton reporting every pattern found in a text, overlaps included"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(pattern_id)
+
+        # Breadth-first pass to wire the failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        """Return the ids of all patterns occurring in text"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found.update(self.output[state])
+        return found
+
+    def to_dict(self):
+        """Automaton tables in a JSON-safe form"""
+        return {'patterns': self.patterns, 'goto': self.goto, 'fail': self.fail, 'output': self.output}
+
+    @classmethod
+    def from_dict(cls, tables):
+        """Rebuild an automaton written by to_dict without re-running construction"""
+        matcher = cls.__new__(cls)
+        matcher.patterns = tables['patterns']
+        matcher.goto = tables['goto']
+        matcher.fail = tables['fail']
+        matcher.output = tables['output']
+        return matcher
+
+# ---------------------------------------------------
+# LOADING AND VALIDATION
+# ---------------------------------------------------
+
+def read_mapping_file(path):
+    """Parse one JSON or YAML mapping file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        try:
+            import yaml  # PyYAML is only needed for YAML mapping files
+        except ImportError:
+            raise ValueError(f"{path}: install PyYAML to load YAML mapping files")
+        return yaml.safe_load(f)
+
+def validate_mapping_config(config, source):
+    """Raise ValueError listing every problem in a parsed mapping file"""
+    if not isinstance(config, dict):
+        raise ValueError(f"{source}: expected a mapping object at the top level")
+
+    errors = []
+    if config.get('format_version') != MAPPING_FORMAT_VERSION:
+        errors.append(f"format_version must be {MAPPING_FORMAT_VERSION}, got {config.get('format_version')!r}")
+    for field in REQUIRED_DATASET_FIELDS:
+        if not config.get(field):
+            errors.append(f"missing '{field}'")
+
+    for rule, value in (config.get('period_rules') or {}).items():
+        if rule not in PERIOD_RULE_TYPES:
+            errors.append(f"unknown period rule '{rule}'")
+        elif not isinstance(value, PERIOD_RULE_TYPES[rule]) or isinstance(value, bool):
+            errors.append(f"period rule '{rule}' has the wrong type: {value!r}")
+
+    seen_codes, seen_patterns = set(), {}
+    for i, entry in enumerate(config.get('codes') or []):
+        missing = [field for field in REQUIRED_CODE_FIELDS
+                   if not isinstance(entry, dict) or not isinstance(entry.get(field), str) or not entry[field].strip()]
+        if missing:
+            errors.append(f"codes[{i}] is missing {', '.join(missing)}")
+            continue
+        if entry['code'] in seen_codes:
+            errors.append(f"codes[{i}] repeats code {entry['code']}")
+        seen_codes.add(entry['code'])
+
+        # Two codes with one pattern would always resolve to the same row
+        pattern = normalize_label(entry['excel_pattern'])
+        if pattern in seen_patterns:
+            errors.append(f"codes[{i}] repeats the excel_pattern of {seen_patterns[pattern]}")
+        seen_patterns[pattern] = entry['code']
+
+        # Parents must come first, which also rules out cycles
+        if 'parent' in entry and entry['parent'] not in seen_codes - {entry['code']}:
+            errors.append(f"codes[{i}] has parent {entry['parent']!r}, which is not an earlier code")
+        if not isinstance(entry.get('total', False), bool):
+            errors.append(f"codes[{i}] 'total' must be true or false")
+
+    totals = [entry.get('code') for entry in config.get('codes') or [] if isinstance(entry, dict) and entry.get('total')]
+    if len(totals) > 1:
+        errors.append(f"only one code can be the total, got {', '.join(totals)}")
+
+    if errors:
+        raise ValueError(f"{source}: invalid mapping configuration:\n  " + "\n  ".join(errors))
+
+def mapping_from_config(config):
+    """The ordered {code: {'english', 'chinese', 'excel_pattern'[, 'parent'][, 'total']}} table of a mapping file.
+
+    parent and total only steer row resolution; MappedResult leaves them out of 'mapping_info'.
+    """
+    mapping = {}
+    for entry in config['codes']:
+        mapping[entry['code']] = {'english': entry['english'],
+                                  'chinese': entry['chinese'],
+                                  'excel_pattern': entry['excel_pattern']}
+        if entry.get('parent'):
+            mapping[entry['code']]['parent'] = entry['parent']
+        if entry.get('total'):
+            mapping[entry['code']]['total'] = True
+    return mapping
+
+def load_dataset_configs(mapping_dir):
+    """Load and validate every mapping file into {dataset: registry entry}, sorted by dataset name"""
+    paths = sorted(path for pattern in MAPPING_FILE_PATTERNS for path in glob.glob(os.path.join(mapping_dir, pattern)))
+    if not paths:
+        raise ValueError(f"No mapping files found in {mapping_dir}")
+
+    datasets = {}
+    for path in paths:
+        config = read_mapping_file(path)
+        validate_mapping_config(config, path)
+        name = config['dataset']
+        if name in datasets:
+            raise ValueError(f"{path}: dataset {name} is already defined by {datasets[name]['mapping_file']}")
+
+        datasets[name] = {
+            'section': config['section'],
+            'file_prefix': config['file_prefix'],
+            'link_title': config.get('link_title'),
+            'mapping': mapping_from_config(config),
+            'period_rules': config.get('period_rules') or {},
+            'mapping_file': path
+        }
+    return dict(sorted(datasets.items()))
+
+# ---------------------------------------------------
+# COMPILED MATCHERS
+# ---------------------------------------------------
+COMPILED_FORMAT_VERSION = 2   # Bump when the compiled layout changes, so stale disk entries are rebuilt
+_compiled = {}    # mapping hash -> compiled matcher, per process
+
+def mapping_hash(mapping):
+    """Stable short hash of a mapping table's content and order"""
+    payload = json.dumps(list(mapping.items()), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def compile_mapping(mapping):
+    """Normalize the patterns of a mapping table once and build their automaton.
+
+    The automaton holds the English pattern and the Chinese label of every code,
+    so sheets labelled in either language match; pattern_codes maps each
+    automaton pattern back to the index of its code.
+    """
+    codes = list(mapping)
+    patterns = [normalize_label(mapping[code]['excel_pattern']) for code in codes]
+    chinese = [mapping[code].get('chinese', '') for code in codes]
+
+    match_patterns, pattern_codes = list(patterns), list(range(len(codes)))
+    for i, label in enumerate(chinese):
+        if normalize_label(label):
+            match_patterns.append(normalize_label(label))
+            pattern_codes.append(i)
+
+    return {
+        'codes': codes,
+        'patterns': patterns,
+        'chinese': chinese,
+        'parents': [mapping[code].get('parent') for code in codes],
+        'total_code': next((code for code in codes if mapping[code].get('total')), None),
+        'pattern_codes': pattern_codes,
+        'matcher': MultiPatternMatcher(match_patterns)
+    }
+
+def compiled_mapping(mapping, cache_dir=None):
+    """Compiled matcher of a mapping table, from memory, then the disk cache, else built and cached"""
+    key = mapping_hash(mapping)
+    if key in _compiled:
+        return _compiled[key]
+
+    if cache_dir is None:
+        from config import mapping_cache_dir as cache_dir
+    path = os.path.join(cache_dir, f"{key}_v{COMPILED_FORMAT_VERSION}.json")
+
+    compiled = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        compiled = dict(stored, matcher=MultiPatternMatcher.from_dict(stored['matcher']))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    if compiled is None or compiled['codes'] != list(mapping):
+        compiled = compile_mapping(mapping)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(compiled, matcher=compiled['matcher'].to_dict()), f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠ Could not cache compiled mapping {key}: {e}")
+
+    _compiled[key] = compiled
+    return compiled
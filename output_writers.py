@@ -0,0 +1,367 @@
+# ---------------------------------------------------
+# OUTPUT WRITERS
+# ---------------------------------------------------
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from config import OUTPUT_SINKS, TLID_MAPPING, history_store_dir, output_dir, tlid_order
+from watermarks import dataset_name
+
+# ---------------------------------------------------
+# OUTPUT FUNCTIONS
+# ---------------------------------------------------
+
+def create_tlid_format_data(mapped_data, latest_period=None, periods=None, mapping=None):
+    """Create data in the exact TLID format: a header row, then one row per period.
+
+    By default only the most recent period is written; pass periods to emit a
+    row for each of them (full-history backfill). Columns follow the 17-1 TLID
+    order unless another dataset's mapping is given.
+    """
+    code_order = tlid_order if mapping is None else list(mapping)
+    mapping = TLID_MAPPING if mapping is None else mapping
+
+    # Prefer the period selected by the header index, else find it in the mapped data
+    if latest_period is None:
+        for tlid_code, data in mapped_data.items():
+            if data.get('data'):
+                found = [key.split('_')[0] for key in data['data'].keys() if '_amount' in key]
+                for period in found:
+                    if latest_period is None or period > latest_period:
+                        latest_period = period
+
+    if not periods:
+        periods = [latest_period] if latest_period else []
+
+    if not periods:
+        print("No period data found")
+        return None
+
+    if len(periods) == 1:
+        print(f"Creating TLID format for period: {periods[0]}")
+    else:
+        print(f"Creating TLID format for {len(periods)} periods: {periods[0]} to {periods[-1]}")
+
+    # Build header row (English titles)
+    header_data = {}
+    for tlid_code in code_order:
+        if tlid_code in mapped_data:
+            header_data[tlid_code] = mapped_data[tlid_code]['mapping_info']['english']
+        else:
+            header_data[tlid_code] = mapping.get(tlid_code, {}).get('english', '')
+
+    # Build data rows (amounts) - preserve full precision
+    data_rows = []
+    for period in periods:
+        data_row = {'Period': period}
+        amount_key = f"{period}_amount"
+        for tlid_code in code_order:
+            value = mapped_data.get(tlid_code, {}).get('data', {}).get(amount_key)
+            if value is None:
+                data_row[tlid_code] = ""
+            elif isinstance(value, (int, float)):
+                # Don't round - keep the full precision from the formula bar
+                data_row[tlid_code] = value
+            else:
+                data_row[tlid_code] = str(value)
+        data_rows.append(data_row)
+
+    # Row 1: Headers (no Period column), then the data rows (with Period)
+    header_row_dict = {'Period': ""}
+    for tlid_code in code_order:
+        header_row_dict[tlid_code] = header_data.get(tlid_code, "")
+    final_data = [header_row_dict] + data_rows
+
+    # Convert to DataFrame
+    df = pd.DataFrame(final_data)
+
+    # Reorder columns: Period first, then TLID codes in order
+    column_order = ['Period'] + code_order
+    df = df[column_order]
+
+    return df
+
+def create_history_records(mapped_data):
+    """Flatten mapped data into long-format (tlid_code, period, value) records.
+
+    Codes follow the 17-1 TLID order; codes of other datasets keep their mapped order after them.
+    """
+    rank = {tlid_code: i for i, tlid_code in enumerate(tlid_order)}
+    codes = sorted(mapped_data, key=lambda code: rank.get(code, len(rank)))
+    position = {tlid_code: i for i, tlid_code in enumerate(codes)}
+
+    records = []
+    for tlid_code in codes:
+        entry = mapped_data[tlid_code]
+        if not entry:
+            continue
+        for key, value in entry.get('data', {}).items():
+            if key.endswith('_amount'):
+                records.append({
+                    'tlid_code': tlid_code,
+                    'english': entry['mapping_info']['english'],
+                    'chinese': entry['mapping_info']['chinese'],
+                    'period': key[:-len('_amount')],
+                    'value': value
+                })
+    records.sort(key=lambda r: (r['period'], position[r['tlid_code']]))
+    return records
+
+# ---------------------------------------------------
+# OUTPUT SINKS
+# ---------------------------------------------------
+
+@contextlib.contextmanager
+def atomic_output(path):
+    """Yield a temporary path beside path and rename it into place when the block succeeds"""
+    stem, ext = os.path.splitext(path)
+    temp_path = f"{stem}.{os.getpid()}.{threading.get_ident()}.tmp{ext}"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def append_tlid_format_rows(tlid_format_data, csv_path):
+    """Append TLID format data rows to a running CSV, writing the header row only once"""
+    rows = tlid_format_data.iloc[1:]  # Row 0 holds the English titles
+    with atomic_output(csv_path) as temp_path:
+        if os.path.exists(csv_path):
+            shutil.copyfile(csv_path, temp_path)
+            rows.to_csv(temp_path, mode='a', header=False, index=False)
+        else:
+            tlid_format_data.to_csv(temp_path, index=False)
+    return len(rows)
+
+def require_tlid_format_data(job):
+    """The job's TLID format table; raises when it could not be built so the sink counts as failed"""
+    if job.get('tlid_format_error') is not None:
+        raise RuntimeError(f"TLID format data could not be created: {job['tlid_format_error']}")
+    tlid_format_data = job['tlid_format_data']
+    if tlid_format_data is None or tlid_format_data.empty:
+        raise ValueError("No TLID format data created - check data extraction")
+    return tlid_format_data
+
+def json_sink(job):
+    """Mapped data and metadata as one JSON document"""
+    json_path = os.path.join(output_dir, f"{job['base_name']}_mapped_{job['timestamp']}.json")
+    output_data = {
+        'metadata': job['metadata'],
+        'mapped_data': job['mapped_data']
+    }
+    with atomic_output(json_path) as temp_path:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(output_data, f, indent=2, ensure_ascii=False)
+
+    print(f"✓ Saved mapped data to: {json_path}")
+    return [json_path]
+
+def csv_sink(job):
+    """TLID format CSV (horizontal layout), plus a long-format history CSV for backfills"""
+    saved_files = []
+    tlid_format_data = require_tlid_format_data(job)
+    metadata = job['metadata']
+
+    if metadata.get('since_period') is not None:
+        # Incremental runs only append the new period rows to one running file
+        csv_path = os.path.join(output_dir, f"{dataset_name(job['original_filename'])}_TLID_format.csv")
+        appended = append_tlid_format_rows(tlid_format_data, csv_path)
+        saved_files.append(csv_path)
+        print(f"✓ Appended {appended} period row(s) to: {csv_path}")
+    else:
+        csv_path = os.path.join(output_dir, f"{job['base_name']}_TLID_format_{job['timestamp']}.csv")
+        with atomic_output(csv_path) as temp_path:
+            tlid_format_data.to_csv(temp_path, index=False)
+        saved_files.append(csv_path)
+        print(f"✓ Saved TLID format CSV to: {csv_path}")
+
+    # Full-history runs also get a long-format file with one row per (code, period)
+    if metadata.get('backfill'):
+        history_path = os.path.join(output_dir, f"{job['base_name']}_history_{job['timestamp']}.csv")
+        with atomic_output(history_path) as temp_path:
+            pd.DataFrame(create_history_records(job['mapped_data'])).to_csv(temp_path, index=False)
+        saved_files.append(history_path)
+        print(f"✓ Saved long-format history to: {history_path}")
+
+    return saved_files
+
+XLSX_NUMBER_FORMAT = '0.000000'  # Full precision for the amount columns
+
+def write_tlid_format_workbook(tlid_format_data, excel_path):
+    """Write a TLID format table to a new workbook with full-precision number formatting"""
+    with atomic_output(excel_path) as temp_path:
+        # Use xlsxwriter engine for better number formatting control
+        with pd.ExcelWriter(temp_path, engine='xlsxwriter') as writer:
+            tlid_format_data.to_excel(writer, index=False, sheet_name='TLID_Data')
+
+            # Get the xlsxwriter workbook and worksheet objects
+            workbook = writer.book
+            worksheet = writer.sheets['TLID_Data']
+
+            # Define a number format that shows full precision
+            number_format = workbook.add_format({'num_format': XLSX_NUMBER_FORMAT})
+
+            # Apply number format to data rows (skip header rows)
+            for col_num, tlid_code in enumerate(tlid_format_data.columns[1:]):
+                worksheet.set_column(col_num + 1, col_num + 1, 15, number_format)
+
+def append_tlid_format_workbook_rows(tlid_format_data, excel_path):
+    """Append TLID format data rows to a running workbook written by write_tlid_format_workbook"""
+    import openpyxl
+
+    rows = tlid_format_data.iloc[1:]  # Row 0 holds the English titles
+    with atomic_output(excel_path) as temp_path:
+        book = openpyxl.load_workbook(excel_path)
+        sheet = book['TLID_Data']
+        for row in rows.itertuples(index=False):
+            sheet.append([None if value == "" else value for value in row])
+            for cell in sheet[sheet.max_row][1:]:
+                cell.number_format = XLSX_NUMBER_FORMAT
+        book.save(temp_path)
+    return len(rows)
+
+def xlsx_sink(job):
+    """TLID format workbook with full-precision number formatting"""
+    tlid_format_data = require_tlid_format_data(job)
+
+    if job['metadata'].get('since_period') is not None:
+        # Incremental runs append the new period rows to one running workbook, like the CSV sink
+        excel_path = os.path.join(output_dir, f"{dataset_name(job['original_filename'])}_TLID_format.xlsx")
+        if os.path.exists(excel_path):
+            appended = append_tlid_format_workbook_rows(tlid_format_data, excel_path)
+            print(f"✓ Appended {appended} period row(s) to: {excel_path}")
+            return [excel_path]
+    else:
+        excel_path = os.path.join(output_dir, f"{job['base_name']}_TLID_format_{job['timestamp']}.xlsx")
+
+    write_tlid_format_workbook(tlid_format_data, excel_path)
+    print(f"✓ Saved TLID format Excel to: {excel_path}")
+    return [excel_path]
+
+def parquet_sink(job):
+    """Upsert into the partitioned (tlid_code, period) history store.
+
+    A job carrying 'history_records' (a batch's combined output) is upserted as
+    is, each record keeping its own source_file.
+    """
+    from history_store import upsert_history  # pyarrow is only loaded when this sink runs
+
+    if job.get('history_records') is not None:
+        written = upsert_history(job['history_records'], history_store_dir)
+    else:
+        written = upsert_history(create_history_records(job['mapped_data']), history_store_dir,
+                                 job['original_filename'])
+    print(f"✓ Upserted {sum(written.values())} records into history store: {history_store_dir}")
+    return []
+
+def sqlite_sink(job):
+    """Upsert values and run metadata into the SQLite database"""
+    from sqlite_sink import save_to_database  # raises sqlite3.Error, so a failed write fails the sink
+
+    save_to_database(job['mapped_data'], job['metadata'], job['original_filename'])
+    return []
+
+# Sinks run in this order when selected; 'none' selects nothing
+SINK_WRITERS = {
+    'json': json_sink,
+    'csv': csv_sink,
+    'xlsx': xlsx_sink,
+    'parquet': parquet_sink,
+    'sqlite': sqlite_sink
+}
+
+def resolve_sinks(sinks=None):
+    """Turn a list or comma-separated string of sink names into registry order"""
+    if sinks is None:
+        sinks = OUTPUT_SINKS
+    if isinstance(sinks, str):
+        sinks = [name.strip() for name in sinks.split(',') if name.strip()]
+
+    unknown = [name for name in sinks if name != 'none' and name not in SINK_WRITERS]
+    if unknown:
+        raise ValueError(f"Unknown output sink(s): {', '.join(unknown)} "
+                         f"(choose from {', '.join(list(SINK_WRITERS) + ['none'])})")
+    return [name for name in SINK_WRITERS if name in sinks]
+
+def run_sink(name, job):
+    """Run one sink and time it; returns (saved_files, seconds, error)"""
+    started = time.perf_counter()
+    try:
+        saved_files, error = SINK_WRITERS[name](job), None
+    except Exception as e:
+        saved_files, error = [], e
+    return saved_files, time.perf_counter() - started, error
+
+def sink_job(mapped_data, metadata, original_filename):
+    """The job handed to each sink writer for one mapped workbook"""
+    return {
+        'mapped_data': mapped_data,
+        'metadata': metadata,
+        'original_filename': original_filename,
+        'base_name': os.path.splitext(original_filename)[0],
+        'timestamp': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'tlid_format_data': None,
+        'tlid_format_error': None
+    }
+
+def save_processed_data(mapped_data, metadata, original_filename, sinks=None, mapping=None):
+    """Write the processed and mapped data through the selected sinks, concurrently.
+
+    mapping sets the TLID format columns of datasets other than 17-1. Returns
+    (saved_files, sink_errors), where sink_errors maps every selected sink to the
+    exception it raised, or None when it succeeded.
+    """
+    if not mapped_data:
+        print("No data to save")
+        return [], {}
+
+    selected = resolve_sinks(sinks)
+    job = sink_job(mapped_data, metadata, original_filename)
+
+    # The CSV and XLSX sinks share one TLID format table, built before they start
+    if 'csv' in selected or 'xlsx' in selected:
+        try:
+            incremental = metadata.get('since_period') is not None
+            periods = metadata.get('periods') if metadata.get('backfill') or incremental else None
+            job['tlid_format_data'] = create_tlid_format_data(mapped_data, metadata.get('latest_period'), periods,
+                                                              mapping)
+        except Exception as e:
+            job['tlid_format_error'] = e
+            print(f"✗ Error creating TLID format: {e}")
+            import traceback
+            traceback.print_exc()
+
+    # Sinks write to separate targets, so they run side by side
+    outcomes = {}
+    if selected:
+        with ThreadPoolExecutor(max_workers=len(selected)) as executor:
+            futures = {name: executor.submit(run_sink, name, job) for name in selected}
+            outcomes = {name: future.result() for name, future in futures.items()}
+    else:
+        print("No output sinks selected, nothing written")
+
+    saved_files, sink_errors = [], {}
+    for name, (paths, seconds, error) in outcomes.items():
+        saved_files.extend(paths)
+        sink_errors[name] = error
+        if error is not None:
+            print(f"✗ {name} sink failed after {seconds:.2f}s: {error}")
+    if outcomes:
+        print("Sink timings: " + ", ".join(f"{name} {seconds:.3f}s" for name, (_, seconds, _) in outcomes.items()))
+
+    # Print summary
+    print(f"\n--- PROCESSING SUMMARY ---")
+    print(f"Total TLID codes: {metadata['total_tlid_codes']}")
+    print(f"Successfully mapped: {metadata['successfully_mapped']}")
+    print(f"Success rate: {(metadata['successfully_mapped']/metadata['total_tlid_codes']*100):.1f}%")
+
+    return saved_files, sink_errors
@@ -0,0 +1,136 @@
+# ---------------------------------------------------
+# CONTENT-HASH PROCESSING CACHE
+# ---------------------------------------------------
+import hashlib
+import io
+import json
+import os
+import threading
+from datetime import datetime
+
+from excel_processing import process_excel_result, workbook_name
+from mapped_result import MappedResult
+
+# ---------------------------------------------------
+# CACHE CONFIGURATION
+# ---------------------------------------------------
+# Bump when the pipeline changes in a way that alters mapped output
+PIPELINE_VERSION = 4
+
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+CACHE_MAX_ENTRIES = 500
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ---------------------------------------------------
+# KEY FUNCTIONS
+# ---------------------------------------------------
+
+def file_sha256(file_path):
+    """SHA-256 of a file's bytes (or of an in-memory workbook buffer)"""
+    if isinstance(file_path, io.BytesIO):
+        return hashlib.sha256(file_path.getvalue()).hexdigest()
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def mapping_version(mapping, period_rules=None):
+    """Stable short hash of a mapping table (content and code order), its period rules and the pipeline version"""
+    key = {'pipeline': PIPELINE_VERSION, 'mapping': list(mapping.items())}
+    if period_rules:
+        key['period_rules'] = period_rules
+    payload = json.dumps(key, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+# ---------------------------------------------------
+# CACHE FUNCTIONS
+# ---------------------------------------------------
+
+def cache_entry_path(cache_dir, content_hash, version, backfill=False, since_period=None):
+    suffix = "_backfill" if backfill else ""
+    if since_period is not None:
+        suffix += f"_since{since_period}"
+    return os.path.join(cache_dir, f"{content_hash}_{version}{suffix}.json")
+
+def load_cached_result(entry_path):
+    """Read a cached result and mark it as recently used"""
+    try:
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    os.utime(entry_path)  # The file's mtime is the LRU clock
+    return entry
+
+def store_cached_result(entry_path, result, metadata):
+    """Write a compact result atomically; the temp name is per process and thread so parallel workers never collide"""
+    temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'result': result.to_dict(), 'metadata': metadata}, f, ensure_ascii=False)
+    os.replace(temp_path, entry_path)
+
+def evict_cache(cache_dir, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+    """Remove least recently used entries until the cache fits its bounds"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.json'):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    entries.sort()
+    total_bytes = sum(size for _, size, _ in entries)
+
+    evicted = 0
+    while entries and (total_bytes > max_bytes or len(entries) > max_entries):
+        _, size, name = entries.pop(0)
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass  # Already evicted by a concurrent worker
+        total_bytes -= size
+        evicted += 1
+    return evicted
+
+def cached_process_excel_result(file_path, mapping, cache_dir, file_format=None, backfill=False, since_period=None,
+                                period_rules=None, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+    """process_excel_result that skips the workbook entirely when identical bytes were already mapped"""
+    os.makedirs(cache_dir, exist_ok=True)
+
+    content_hash = file_sha256(file_path)
+    entry_path = cache_entry_path(cache_dir, content_hash, mapping_version(mapping, period_rules), backfill,
+                                  since_period)
+
+    entry = load_cached_result(entry_path)
+    if entry is not None:
+        try:
+            cached = MappedResult.from_dict(entry['result'], mapping)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"⚠ Ignoring unusable processing cache entry for {workbook_name(file_path)}: {e}")
+        else:
+            print(f"✓ Processing cache hit for {workbook_name(file_path)} (sha256 {content_hash[:12]})")
+            metadata = dict(entry['metadata'],
+                            file_processed=workbook_name(file_path),
+                            processing_date=datetime.now().isoformat(),
+                            cache_hit=True)
+            return cached, metadata
+
+    result, metadata = process_excel_result(file_path, mapping, file_format, backfill, since_period, period_rules)
+    if result and metadata:
+        metadata['content_sha256'] = content_hash
+        store_cached_result(entry_path, result, metadata)
+        evicted = evict_cache(cache_dir, max_bytes, max_entries)
+        if evicted:
+            print(f"  Evicted {evicted} old processing cache entries")
+
+    return result, metadata
+
+def cached_process_excel_file(file_path, mapping, cache_dir, file_format=None, backfill=False, since_period=None,
+                              period_rules=None, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+    """cached_process_excel_result expanded into the nested mapped_data layout"""
+    result, metadata = cached_process_excel_result(file_path, mapping, cache_dir, file_format, backfill,
+                                                   since_period, period_rules, max_bytes, max_entries)
+    if result is None:
+        return None, None
+    return result.to_mapped_data(), metadata
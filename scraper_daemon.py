@@ -0,0 +1,347 @@
+# ---------------------------------------------------
+# LONG-LIVED SCRAPER DAEMON WITH WARM BROWSERS
+# ---------------------------------------------------
+import argparse
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from config import (ARCHIVE_CAPTURES, BROWSER_PROFILES, CHROME_PROFILE, DATASETS, SELENIUM_CAPTURE,
+                    daemon_authkey_path, dataset_for_file, download_dir, ensure_directories)
+from excel_processing import workbook_name
+from orchestrator import apply_mapping, save_outputs, validate_download
+from selenium_flow import (archive_capture, browser_rss_mb, capture_with_selenium, create_driver,
+                           download_with_selenium)
+
+# ---------------------------------------------------
+# DAEMON CONFIGURATION
+# ---------------------------------------------------
+DAEMON_ADDRESS = ('127.0.0.1', int(os.environ.get("TLID_DAEMON_PORT", "6010")))
+AUTHKEY_BYTES = 32          # Random key generated on the first `serve` when TLID_DAEMON_AUTHKEY is unset
+
+POOL_SIZE = 1                 # Warm browser sessions (and job workers)
+MAX_JOBS_PER_BROWSER = 25     # Recycle a browser after this many jobs
+MAX_BROWSER_RSS_MB = 1024     # ...or once its process tree grows past this
+LATENCY_HISTORY = 100         # Recent job latencies kept for the stats command
+SESSION_DIR_PREFIX = "browser-"  # Each pooled browser downloads into download_dir/browser-<slot>
+
+def daemon_authkey(create=False, path=daemon_authkey_path):
+    """TLID_DAEMON_AUTHKEY, else the key in an owner-only file that the first `serve` creates.
+
+    Connections are unpickled once authenticated, so the key must not be guessable.
+    """
+    if os.environ.get("TLID_DAEMON_AUTHKEY"):
+        return os.environ["TLID_DAEMON_AUTHKEY"].encode('utf-8')
+
+    try:
+        with open(path, 'rb') as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        raise Exception(f"No daemon key in {path}: start the daemon first or set TLID_DAEMON_AUTHKEY")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    key = secrets.token_hex(AUTHKEY_BYTES).encode('ascii')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return daemon_authkey(False, path)  # Another daemon created it first
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    print(f"✓ Generated daemon key in {path}")
+    return key
+
+# ---------------------------------------------------
+# BROWSER POOL
+# ---------------------------------------------------
+
+class BrowserSession:
+    """One warm WebDriver plus the bookkeeping needed to decide when to recycle it.
+
+    Every pool slot has its own download directory, so concurrent jobs never see
+    each other's files; a recycled browser inherits its slot's directory.
+    """
+
+    def __init__(self, headless=True, profile=CHROME_PROFILE, slot=0):
+        started = time.perf_counter()
+        self.slot = slot
+        self.driver = create_driver(headless, profile, os.path.join(download_dir, f"{SESSION_DIR_PREFIX}{slot}"))
+        self.startup_seconds = time.perf_counter() - started
+        self.jobs_served = 0
+
+    def rss_mb(self):
+        """Resident memory of chromedriver and every browser process it spawned"""
+        return browser_rss_mb(self.driver)
+
+    def healthy(self):
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"⚠ Error closing WebDriver: {e}")
+
+class BrowserPool:
+    """Fixed-size pool of warm browser sessions, recycled on job count, memory or failure"""
+
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_BROWSER, max_rss_mb=MAX_BROWSER_RSS_MB, headless=True,
+                 profile=CHROME_PROFILE):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.headless = headless
+        self.profile = profile
+        self.recycled = 0
+        self.idle = queue.Queue()
+
+        for slot in range(size):
+            self.idle.put(BrowserSession(headless, profile, slot))
+
+    def acquire(self):
+        session = self.idle.get()
+        if not session.healthy():
+            session = self.recycle(session, "failed health check")
+        return session
+
+    def release(self, session):
+        session.jobs_served += 1
+
+        reason = None
+        rss_mb = session.rss_mb()
+        if session.jobs_served >= self.max_jobs:
+            reason = f"served {session.jobs_served} jobs"
+        elif rss_mb > self.max_rss_mb:
+            reason = f"using {rss_mb:.0f} MB"
+        elif not session.healthy():
+            reason = "failed health check"
+
+        if reason:
+            session = self.recycle(session, reason)
+        self.idle.put(session)
+
+    def recycle(self, session, reason):
+        print(f"Recycling browser ({reason})...")
+        session.quit()
+        self.recycled += 1
+        return BrowserSession(self.headless, self.profile, session.slot)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().quit()
+
+# ---------------------------------------------------
+# JOB FUNCTIONS
+# ---------------------------------------------------
+
+def run_scrape_job(pool, job):
+    """Scrape, validate, map and save on a warm browser, timing every stage.
+
+    Mapping and saving go through the orchestrator's pipeline, so jobs share the
+    processing cache with `process` and advance the dataset watermark.
+    """
+    result = {
+        'job_id': job.get('job_id') or uuid.uuid4().hex[:12],
+        'status': 'failed',
+        'started': datetime.now().isoformat()
+    }
+    latency = {}
+    started = time.perf_counter()
+
+    session = pool.acquire()
+    latency['acquire'] = time.perf_counter() - started
+
+    try:
+        # An in-memory capture is parsed from the buffer and archived to disk afterwards
+        stage = time.perf_counter()
+        if SELENIUM_CAPTURE == 'memory':
+            file_path, download_link = capture_with_selenium(session.driver)
+        else:
+            file_path, download_link = download_with_selenium(session.driver)
+        if not file_path:
+            raise Exception("Download did not complete")
+        file_name = workbook_name(file_path)
+        file_path, file_format = validate_download(file_path, file_name, session.driver, download_link)
+        latency['download'] = time.perf_counter() - stage
+        if not file_format:
+            raise Exception(f"{file_name} is not a valid Excel workbook")
+        result['file_path'] = file_path if isinstance(file_path, str) else None
+
+        if job.get('process', True):
+            stage = time.perf_counter()
+            dataset = dataset_for_file(file_name)
+            mapped_data, metadata = apply_mapping(file_path, file_format, job.get('backfill', False), dataset=dataset)
+            latency['process'] = time.perf_counter() - stage
+            if not mapped_data:
+                raise Exception("Failed to process Excel file or apply mapping")
+
+            stage = time.perf_counter()
+            result['outputs'], failed_sinks = save_outputs(mapped_data, metadata, file_name, job.get('sinks'),
+                                                           DATASETS[dataset]['mapping'])
+            latency['save'] = time.perf_counter() - stage
+            if failed_sinks:
+                raise Exception(f"Output sink(s) failed: {', '.join(failed_sinks)}")
+
+        if result['file_path'] is None and ARCHIVE_CAPTURES:
+            result['file_path'] = archive_capture(file_path)
+
+        result['status'] = 'success'
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        result['browser_jobs_served'] = session.jobs_served + 1
+        pool.release(session)
+
+    latency['total'] = time.perf_counter() - started
+    result['latency'] = {stage: round(seconds, 3) for stage, seconds in latency.items()}
+
+    stages = ", ".join(f"{k} {v:.2f}s" for k, v in latency.items() if k != 'total')
+    print(f"Job {result['job_id']} {result['status']} in {latency['total']:.2f}s ({stages})")
+    return result
+
+# ---------------------------------------------------
+# SERVER AND CLIENT
+# ---------------------------------------------------
+
+def serve(address=DAEMON_ADDRESS, authkey=None, pool_size=POOL_SIZE,
+          max_jobs=MAX_JOBS_PER_BROWSER, max_rss_mb=MAX_BROWSER_RSS_MB, headless=True, profile=CHROME_PROFILE):
+    """Keep warm browsers alive and serve scrape jobs from a local queue until stopped"""
+    ensure_directories()
+    authkey = authkey or daemon_authkey(create=True)
+    pool = BrowserPool(pool_size, max_jobs, max_rss_mb, headless, profile)
+    jobs = queue.Queue()
+    latencies = deque(maxlen=LATENCY_HISTORY)
+    counts = {'success': 0, 'failed': 0}
+
+    def worker():
+        while True:
+            item = jobs.get()
+            if item is None:
+                break
+            job, conn = item
+            result = run_scrape_job(pool, job)
+            counts[result['status']] += 1
+            latencies.append(result['latency']['total'])
+            try:
+                conn.send(result)
+            except OSError:
+                pass  # Client went away; the outputs are on disk regardless
+            finally:
+                conn.close()
+
+    def stats():
+        ordered = sorted(latencies)
+        return {
+            'browsers': pool.size,
+            'browser_profile': pool.profile,
+            'browsers_recycled': pool.recycled,
+            'jobs_queued': jobs.qsize(),
+            'jobs_succeeded': counts['success'],
+            'jobs_failed': counts['failed'],
+            'latency_last': latencies[-1] if latencies else None,
+            'latency_median': ordered[len(ordered) // 2] if ordered else None,
+            'latency_max': ordered[-1] if ordered else None
+        }
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(pool_size)]
+    for thread in workers:
+        thread.start()
+
+    print(f"\n--- Scraper daemon listening on {address[0]}:{address[1]} with {pool_size} warm browser(s) ---")
+    try:
+        with Listener(address, authkey=authkey) as listener:
+            while True:
+                try:
+                    conn = listener.accept()
+                    request = conn.recv()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    print(f"⚠ Rejected connection: {e}")
+                    continue
+
+                if not isinstance(request, dict):
+                    print(f"⚠ Rejected malformed request: {type(request).__name__}")
+                    conn.close()
+                    continue
+
+                command = request.get('command', 'scrape')
+                if command == 'stats':
+                    conn.send(stats())
+                    conn.close()
+                elif command == 'shutdown':
+                    conn.send({'status': 'stopping'})
+                    conn.close()
+                    break
+                else:
+                    jobs.put((request, conn))
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+    finally:
+        for _ in workers:
+            jobs.put(None)
+        for thread in workers:
+            thread.join()
+        pool.close()
+        print("--- Scraper daemon stopped ---")
+
+def send_request(request, address=DAEMON_ADDRESS, authkey=None):
+    """Send one request to a running daemon and wait for its reply"""
+    with Client(address, authkey=authkey or daemon_authkey()) as conn:
+        conn.send(request)
+        return conn.recv()
+
+# ---------------------------------------------------
+# COMMAND LINE
+# ---------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived TLID scraper daemon")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="start the daemon")
+    serve_parser.add_argument('--workers', type=int, default=POOL_SIZE, help="warm browser sessions")
+    serve_parser.add_argument('--max-jobs', type=int, default=MAX_JOBS_PER_BROWSER, help="jobs before a browser is recycled")
+    serve_parser.add_argument('--max-rss-mb', type=float, default=MAX_BROWSER_RSS_MB, help="browser memory before it is recycled")
+    serve_parser.add_argument('--headed', action='store_true', help="show the browser windows")
+    serve_parser.add_argument('--profile', choices=BROWSER_PROFILES, default=CHROME_PROFILE,
+                              help="Chrome profile: lean blocks images and CSS (default: TLID_CHROME_PROFILE)")
+
+    submit_parser = subparsers.add_parser('submit', help="queue a scrape job and wait for the result")
+    submit_parser.add_argument('--no-process', action='store_true', help="only download, skip mapping and saving")
+    submit_parser.add_argument('--backfill', action='store_true', help="extract every period, not just the latest")
+    submit_parser.add_argument('--sinks', default=None, help="comma-separated outputs (default: the daemon's TLID_SINKS)")
+
+    subparsers.add_parser('stats', help="show pool and latency statistics")
+    subparsers.add_parser('stop', help="stop the daemon")
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(pool_size=args.workers, max_jobs=args.max_jobs, max_rss_mb=args.max_rss_mb, headless=not args.headed,
+              profile=args.profile)
+    elif args.command == 'submit':
+        result = send_request({'command': 'scrape', 'process': not args.no_process, 'backfill': args.backfill,
+                               'sinks': args.sinks})
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    elif args.command == 'stats':
+        for key, value in send_request({'command': 'stats'}).items():
+            print(f"{key}: {value}")
+    elif args.command == 'stop':
+        print(send_request({'command': 'shutdown'})['status'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+# ---------------------------------------------------
+# SELENIUM DOWNLOAD FLOW
+# ---------------------------------------------------
+import base64
+import io
+import os
+import threading
+import time
+
+import psutil
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from config import (BROWSER_PROFILES, CHROME_PROFILE, DATASETS, DEFAULT_DATASET, DOWNLOAD_PARALLELISM,
+                    DOWNLOAD_TIMEOUT, STEP_BUDGETS, TARGET_URL, chrome_profile_dir, download_dir)
+from download_watcher import DownloadWatcher
+from http_fetch import link_xpath_strategies
+
+POLL_INTERVAL = 0.05    # Seconds between condition checks
+
+# ---------------------------------------------------
+# BROWSER PROFILES
+# ---------------------------------------------------
+# The lean profile skips everything the scrape does not need to find and click a link
+LEAN_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false"
+]
+LEAN_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.stylesheets": 2
+}
+# Blocked through CDP as well, since Chrome ignores the stylesheet preference
+BLOCKED_URL_PATTERNS = ["*.css", "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+                        "*.woff", "*.woff2", "*.ttf", "*.otf"]
+PROFILE_LOCK_FILES = ('SingletonLock', 'lockfile')
+MAX_PROFILE_SLOTS = 16
+RSS_SAMPLE_INTERVAL = 0.25  # Seconds between memory samples of the browser
+
+def free_profile_dir(base_dir=chrome_profile_dir):
+    """First reusable profile directory not locked by a running Chrome"""
+    for slot in range(MAX_PROFILE_SLOTS):
+        path = base_dir if slot == 0 else f"{base_dir}-{slot}"
+        if not any(os.path.lexists(os.path.join(path, name)) for name in PROFILE_LOCK_FILES):
+            return path
+    raise Exception(f"All {MAX_PROFILE_SLOTS} Chrome profile directories under {base_dir} are in use")
+
+def browser_rss_mb(driver):
+    """Resident memory of chromedriver and every browser process it spawned"""
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except (psutil.Error, AttributeError):
+        return 0.0
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+class RssMonitor:
+    """Sample the browser process tree's memory in a background thread and keep the peak"""
+
+    def __init__(self, driver, interval=RSS_SAMPLE_INTERVAL):
+        self.driver = driver
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss_mb = browser_rss_mb(self.driver)
+            if not rss_mb and self.peak_mb:
+                break  # The browser has quit
+            self.peak_mb = max(self.peak_mb, rss_mb)
+
+    def stop(self):
+        self.stopped.set()
+
+# ---------------------------------------------------
+# CONDITION WAITS
+# ---------------------------------------------------
+# Every browser step waits for a condition instead of sleeping, within its
+# STEP_BUDGETS entry; the time actually spent is collected in a waits dict
+
+def wait_for(driver, step, condition, waits):
+    """Wait until condition(driver) is truthy within the step's budget; returns its value"""
+    budget = STEP_BUDGETS[step]
+    started = time.perf_counter()
+    try:
+        return WebDriverWait(driver, budget, poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        raise TimeoutException(f"Step '{step}' did not complete within its {budget:.1f}s budget")
+    finally:
+        waits[step] = waits.get(step, 0.0) + time.perf_counter() - started
+
+def print_step_waits(waits):
+    """Report where the browser time went, step by step"""
+    if not waits:
+        return
+    parts = []
+    for step, seconds in waits.items():
+        budget = STEP_BUDGETS.get(step)
+        marker = "⚠ " if budget and seconds > budget * 0.8 else ""
+        parts.append(f"{marker}{step} {seconds:.2f}s" + (f"/{budget:g}s" if budget else ""))
+    print(f"Step waits: {', '.join(parts)} (total {sum(waits.values()):.2f}s)")
+
+def section_expanded(header):
+    """Condition: the collapse panel after a card header is shown and finished animating"""
+    def condition(driver):
+        panels = header.find_elements(By.XPATH, "following-sibling::*[contains(@class, 'collapse')][1]")
+        if not panels:
+            return True  # No collapsible panel, the links are already on the page
+        classes = panels[0].get_attribute('class') or ""
+        return 'show' in classes.split() and 'collapsing' not in classes and panels[0].is_displayed()
+    return condition
+
+def xls_link_located(name):
+    """Condition: the first strategy that finds a dataset's XLS anchor; returns (link, strategy)"""
+    strategies = link_xpath_strategies(DATASETS[name])
+
+    def condition(driver):
+        for i, xpath in enumerate(strategies, 1):
+            for link in driver.find_elements(By.XPATH, xpath):
+                href = link.get_attribute('href') or ""
+                class_name = link.get_attribute('class') or ""
+                if '.xls' in href.lower() or 'xls' in class_name.lower():
+                    return link, i
+        return False
+    return condition
+
+def scroll_into_view(driver, element):
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center', behavior: 'instant'});", element)
+
+# ---------------------------------------------------
+# SELENIUM FUNCTIONS
+# ---------------------------------------------------
+
+def create_driver(headless=True, profile=CHROME_PROFILE, downloads_to=download_dir):
+    """Set up a Chrome WebDriver that downloads into downloads_to (download_dir by default).
+
+    The directory is kept in driver.download_dir, and the startup time, profile and a
+    peak-memory monitor in driver.browser_metrics.
+    """
+    if profile not in BROWSER_PROFILES:
+        raise ValueError(f"Unknown browser profile: {profile} (choose from {', '.join(BROWSER_PROFILES)})")
+
+    # 1. SETUP THE WEBDRIVER
+    print(f"\nSTEP 1: Setting up the Chrome WebDriver ({profile} profile)...")
+    started = time.perf_counter()
+    chrome_options = Options()
+
+    if headless:
+        # Make the browser headless
+        chrome_options.add_argument("--headless")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+
+    # Allow several downloads from the page without a confirmation prompt
+    os.makedirs(downloads_to, exist_ok=True)
+    prefs = {"download.default_directory": downloads_to,
+             "profile.default_content_setting_values.automatic_downloads": 1}
+
+    if profile == 'lean':
+        # DOMContentLoaded is enough: the links are in the markup, not in late resources
+        chrome_options.page_load_strategy = 'eager'
+        for argument in LEAN_ARGUMENTS:
+            chrome_options.add_argument(argument)
+        chrome_options.add_argument(f"--user-data-dir={free_profile_dir()}")
+        prefs.update(LEAN_PREFS)
+
+    chrome_options.add_experimental_option("prefs", prefs)
+    service = ChromeService()
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+
+    if profile == 'lean':
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"⚠ Could not block page resources through CDP: {e}")
+
+    driver.download_dir = downloads_to
+    driver.browser_metrics = {
+        'profile': profile,
+        'startup_seconds': time.perf_counter() - started,
+        'rss_monitor': RssMonitor(driver).start()
+    }
+    print(f"SUCCESS: WebDriver configured{' (headless mode)' if headless else ''} "
+          f"in {driver.browser_metrics['startup_seconds']:.2f}s.")
+    return driver
+
+def print_browser_metrics(driver, time_to_link=None):
+    """Report browser startup, time from page request to the located link, and peak memory"""
+    metrics = getattr(driver, 'browser_metrics', None)
+    if not metrics:
+        return
+    parts = [f"{metrics['profile']} profile", f"startup {metrics['startup_seconds']:.2f}s"]
+    if time_to_link is not None:
+        parts.append(f"time-to-link {time_to_link:.2f}s")
+    peak_mb = max(metrics['rss_monitor'].peak_mb, browser_rss_mb(driver))
+    parts.append(f"peak RSS {peak_mb:.0f} MB")
+    print(f"Browser metrics: {', '.join(parts)}")
+
+def open_site(driver, waits):
+    """Load the indices page within the 'page' budget"""
+    # 2. ACCESS THE SITE
+    print(f"\nSTEP 2: Accessing the site -> {TARGET_URL}")
+    driver.set_page_load_timeout(STEP_BUDGETS['page'])
+    started = time.perf_counter()
+    try:
+        driver.get(TARGET_URL)
+    except TimeoutException:
+        raise TimeoutException(f"Step 'page' did not complete within its {STEP_BUDGETS['page']:.1f}s budget")
+    finally:
+        waits['page'] = waits.get('page', 0.0) + time.perf_counter() - started
+    print("SUCCESS: Site access complete.")
+
+def expand_section(driver, section, waits):
+    """Click a collapsed card header open and wait until its panel is shown"""
+    # 3. LOCATE AND EXPAND THE CORRECT SECTION
+    print(f"\nSTEP 3: Finding and expanding the '{section}' section...")
+    header_xpath = f"//div[contains(@class, 'card-header') and contains(text(), '{section}')]"
+    section_header = wait_for(driver, 'section_header', EC.element_to_be_clickable((By.XPATH, header_xpath)), waits)
+    scroll_into_view(driver, section_header)
+    section_header.click()
+    print("SUCCESS: Clicked the section header.")
+
+    # 4. WAIT FOR SECTION TO EXPAND
+    print("\nSTEP 4: Waiting for section to expand...")
+    wait_for(driver, 'section_expand', section_expanded(section_header), waits)
+
+def find_download_link(driver, name, waits, clickable=True):
+    """Wait for a dataset's XLS anchor in the expanded section; returns (link, filename).
+
+    With clickable=False the link only needs to be in the DOM (its href is all that is used).
+    """
+    # 5. WAIT FOR THE DATASET'S XLS LINK
+    print(f"\nSTEP 5: Looking for {name} XLS download link...")
+    try:
+        download_link, used_strategy = wait_for(driver, 'link', xls_link_located(name), waits)
+    except TimeoutException:
+        raise Exception(f"Could not find the {name} XLS download link using any strategy")
+
+    # 6. EXTRACT FILE INFO
+    href = download_link.get_attribute('href')
+    filename = href.split('/')[-1] if href else "unknown"
+
+    print(f"\nSTEP 6: Found target link using strategy {used_strategy}:")
+    print(f"  File: {filename}")
+    print(f"  Full URL: {href}")
+
+    # Scroll to the link and wait until nothing covers it
+    if clickable:
+        scroll_into_view(driver, download_link)
+        wait_for(driver, 'link_clickable', EC.element_to_be_clickable(download_link), waits)
+    return download_link, filename
+
+def download_with_selenium(driver, name=DEFAULT_DATASET, waits=None):
+    """Drive Chrome to expand the section and click one dataset's XLS link (17-1 by default).
+
+    Returns (file_path, download_link); file_path is None if the download did not finish.
+    The seconds spent in each step are added to waits and reported.
+    """
+    waits = {} if waits is None else waits
+    started, time_to_link = time.perf_counter(), None
+    try:
+        open_site(driver, waits)
+        expand_section(driver, DATASETS[name]['section'], waits)
+        download_link, filename = find_download_link(driver, name, waits)
+        time_to_link = time.perf_counter() - started
+        file_path = click_and_wait_for_download(download_link, filename, waits=waits,
+                                                directory=getattr(driver, 'download_dir', download_dir))
+        return file_path, download_link
+    finally:
+        print_step_waits(waits)
+        print_browser_metrics(driver, time_to_link)
+
+def download_datasets_with_selenium(driver, names, max_parallel=DOWNLOAD_PARALLELISM, timeout=DOWNLOAD_TIMEOUT,
+                                    waits=None):
+    """Download several datasets in one browser session, with up to max_parallel downloads in flight.
+
+    The page is loaded once and each section expanded once; links are clicked one
+    after another while earlier downloads are still running. Returns
+    {name: (file_path, download_link)}, or the exception for a dataset that failed.
+    """
+    waits = {} if waits is None else waits
+    started, time_to_link = time.perf_counter(), None
+    open_site(driver, waits)
+    downloads = {}
+    in_flight = []  # (name, link, filename, watcher), oldest first
+
+    def finish_oldest():
+        name, link, filename, watcher = in_flight.pop(0)
+        started = time.perf_counter()
+        try:
+            file_path = watcher.wait(timeout)
+        finally:
+            watcher.stop()
+            waits['download'] = waits.get('download', 0.0) + time.perf_counter() - started
+        if file_path:
+            print(f"SUCCESS: {filename} completed. File size: {os.path.getsize(file_path)} bytes")
+        else:
+            print(f"WARNING: {filename} may not have completed within the expected time")
+        downloads[name] = (file_path, link)
+
+    # Datasets of one section are handled together so each section is expanded once
+    open_section = None
+    for name in sorted(names, key=lambda n: DATASETS[n]['section']):
+        try:
+            if DATASETS[name]['section'] != open_section:
+                expand_section(driver, DATASETS[name]['section'], waits)
+                open_section = DATASETS[name]['section']
+            link, filename = find_download_link(driver, name, waits)
+            if time_to_link is None:
+                time_to_link = time.perf_counter() - started
+        except Exception as e:
+            print(f"✗ {name} download failed: {e}")
+            downloads[name] = e
+            continue
+
+        if len(in_flight) >= max_parallel:
+            finish_oldest()
+
+        # Start watching before the click so a fast download cannot be missed
+        watcher = DownloadWatcher(getattr(driver, 'download_dir', download_dir), filename).start()
+        try:
+            link.click()
+        except Exception as e:
+            watcher.stop()
+            print(f"✗ {name} download failed: {e}")
+            downloads[name] = e
+            continue
+        print(f"\nSTEP 7: Clicked download link. {filename} is downloading ({len(in_flight) + 1} in flight)...")
+        in_flight.append((name, link, filename, watcher))
+
+    while in_flight:
+        finish_oldest()
+    print_step_waits(waits)
+    print_browser_metrics(driver, time_to_link)
+    return downloads
+
+def click_and_wait_for_download(link, filename, timeout=DOWNLOAD_TIMEOUT, waits=None, directory=download_dir):
+    """Click a download link and wait for the final rename of that exact file in the browser's download directory"""
+    # Start watching before the click so a fast download cannot be missed
+    watcher = DownloadWatcher(directory, filename).start()
+    started = time.perf_counter()
+    try:
+        link.click()
+        print(f"\nSTEP 7: Clicked download link. Waiting for {filename} to complete...")
+        file_path = watcher.wait(timeout)
+    finally:
+        watcher.stop()
+        if waits is not None:
+            waits['download'] = waits.get('download', 0.0) + time.perf_counter() - started
+
+    if file_path:
+        print(f"SUCCESS: Download completed. File size: {os.path.getsize(file_path)} bytes")
+    else:
+        print("WARNING: Download may not have completed within the expected time")
+    return file_path
+
+# ---------------------------------------------------
+# IN-MEMORY CAPTURE
+# ---------------------------------------------------
+# Instead of clicking the link and watching download_dir, the page fetches the
+# href itself (same origin, the browser's own cookies) and hands the bytes back
+# base64-encoded. The parser reads them from an io.BytesIO named after the file.
+FETCH_SCRIPT = """
+const url = arguments[0], done = arguments[arguments.length - 1];
+fetch(url, {credentials: 'include'})
+    .then(response => {
+        if (!response.ok) throw new Error('HTTP ' + response.status);
+        return response.arrayBuffer();
+    })
+    .then(body => {
+        const bytes = new Uint8Array(body);
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        done({data: btoa(binary)});
+    })
+    .catch(error => done({error: String(error)}));
+"""
+
+def fetch_in_browser(driver, url, timeout=DOWNLOAD_TIMEOUT):
+    """GET url from inside the page and return the response body"""
+    driver.set_script_timeout(timeout)
+    outcome = driver.execute_async_script(FETCH_SCRIPT, url)
+    if not outcome or 'data' not in outcome:
+        raise Exception(f"In-browser fetch of {url} failed: {(outcome or {}).get('error', 'no response')}")
+    return base64.b64decode(outcome['data'])
+
+def capture_with_selenium(driver, name=DEFAULT_DATASET, waits=None):
+    """Like download_with_selenium, but fetch the XLS into memory instead of clicking the link.
+
+    Returns (buffer, download_link), where buffer is an io.BytesIO whose .name is the
+    served file name; nothing is written to download_dir (see archive_capture).
+    """
+    waits = {} if waits is None else waits
+    started, time_to_link = time.perf_counter(), None
+    try:
+        open_site(driver, waits)
+        expand_section(driver, DATASETS[name]['section'], waits)
+        download_link, filename = find_download_link(driver, name, waits, clickable=False)
+        time_to_link = time.perf_counter() - started
+
+        print(f"\nSTEP 7: Fetching {filename} inside the browser...")
+        fetch_started = time.perf_counter()
+        try:
+            data = fetch_in_browser(driver, download_link.get_attribute('href'))
+        finally:
+            waits['fetch'] = waits.get('fetch', 0.0) + time.perf_counter() - fetch_started
+        print(f"SUCCESS: Captured {len(data)} bytes in memory")
+
+        buffer = io.BytesIO(data)
+        buffer.name = filename
+        return buffer, download_link
+    finally:
+        print_step_waits(waits)
+        print_browser_metrics(driver, time_to_link)
+
+def archive_capture(buffer, directory=download_dir):
+    """Write a captured workbook to directory under its served name, atomically; returns the path"""
+    path = os.path.join(directory, buffer.name)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(temp_path, path)
+    print(f"✓ Archived captured workbook to: {path}")
+    return path
@@ -0,0 +1,173 @@
+# ---------------------------------------------------
+# SQLITE TIME-SERIES SINK
+# ---------------------------------------------------
+import sqlite3
+from datetime import datetime
+
+from config import database_path
+from output_writers import create_history_records
+
+# ---------------------------------------------------
+# DATABASE SCHEMA
+# ---------------------------------------------------
+# tlid_values is clustered on (tlid_code, period), so "series for a code" and
+# "latest value per code" are primary-key range scans
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    source_file TEXT NOT NULL UNIQUE,
+    content_sha256 TEXT,
+    processing_date TEXT,
+    latest_period TEXT,
+    backfill INTEGER NOT NULL DEFAULT 0,
+    total_tlid_codes INTEGER,
+    successfully_mapped INTEGER,
+    updated TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS mapping_details (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    tlid_code TEXT NOT NULL,
+    status TEXT NOT NULL,
+    excel_row INTEGER,
+    data_points INTEGER,
+    PRIMARY KEY (run_id, tlid_code)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tlid_values (
+    tlid_code TEXT NOT NULL,
+    period TEXT NOT NULL,
+    value REAL,
+    english TEXT,
+    chinese TEXT,
+    run_id INTEGER REFERENCES runs(run_id),
+    updated TEXT NOT NULL,
+    PRIMARY KEY (tlid_code, period)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_tlid_values_period ON tlid_values (period, tlid_code);
+CREATE INDEX IF NOT EXISTS idx_mapping_details_status ON mapping_details (status);
+"""
+
+UPSERT_RUN_SQL = """
+INSERT INTO runs (source_file, content_sha256, processing_date, latest_period, backfill,
+                  total_tlid_codes, successfully_mapped, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (source_file) DO UPDATE SET
+    content_sha256 = excluded.content_sha256,
+    processing_date = excluded.processing_date,
+    latest_period = excluded.latest_period,
+    backfill = excluded.backfill,
+    total_tlid_codes = excluded.total_tlid_codes,
+    successfully_mapped = excluded.successfully_mapped,
+    updated = excluded.updated
+RETURNING run_id
+"""
+
+UPSERT_VALUE_SQL = """
+INSERT INTO tlid_values (tlid_code, period, value, english, chinese, run_id, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (tlid_code, period) DO UPDATE SET
+    value = excluded.value,
+    english = excluded.english,
+    chinese = excluded.chinese,
+    run_id = excluded.run_id,
+    updated = excluded.updated
+"""
+
+BATCH_SIZE = 500    # Rows per executemany call
+
+# ---------------------------------------------------
+# DATABASE FUNCTIONS
+# ---------------------------------------------------
+
+def connect_database(db_path=database_path):
+    """Open the database in WAL mode and create the schema if needed"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL; fsyncs only at checkpoints
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA_SQL)
+    return conn
+
+def write_run(conn, mapped_data, metadata, source_file):
+    """Upsert one processed workbook in a single transaction; returns (run_id, values written)"""
+    updated = datetime.now().isoformat()
+    details = metadata.get('mapping_details', {})
+
+    with conn:
+        run_id = conn.execute(UPSERT_RUN_SQL, (
+            source_file,
+            metadata.get('content_sha256'),
+            metadata.get('processing_date'),
+            metadata.get('latest_period'),
+            int(bool(metadata.get('backfill'))),
+            metadata.get('total_tlid_codes'),
+            metadata.get('successfully_mapped'),
+            updated
+        )).fetchone()[0]
+
+        # Re-processing replaces the previous statuses of this workbook
+        conn.execute("DELETE FROM mapping_details WHERE run_id = ?", (run_id,))
+        conn.executemany(
+            "INSERT INTO mapping_details (run_id, tlid_code, status, excel_row, data_points) VALUES (?, ?, ?, ?, ?)",
+            [(run_id, code, d['status'], d.get('excel_row'), d.get('data_points')) for code, d in details.items()]
+        )
+
+        rows = [(r['tlid_code'], r['period'], r['value'], r['english'], r['chinese'], run_id, updated)
+                for r in create_history_records(mapped_data)]
+        for start in range(0, len(rows), BATCH_SIZE):
+            conn.executemany(UPSERT_VALUE_SQL, rows[start:start + BATCH_SIZE])
+
+    return run_id, len(rows)
+
+def save_to_database(mapped_data, metadata, original_filename, db_path=database_path):
+    """Upsert a processed run into the SQLite database; sqlite3.Error propagates to the caller"""
+    conn = connect_database(db_path)
+    try:
+        run_id, written = write_run(conn, mapped_data, metadata, original_filename)
+    finally:
+        conn.close()
+
+    print(f"✓ Upserted {written} values into SQLite run {run_id}: {db_path}")
+    return run_id
+
+# ---------------------------------------------------
+# QUERY FUNCTIONS
+# ---------------------------------------------------
+
+def latest_values(conn, codes=None):
+    """Latest stored value per TLID code"""
+    sql = """
+        SELECT v.tlid_code, v.period, v.value, v.english, v.chinese, v.run_id
+        FROM tlid_values v
+        WHERE v.period = (SELECT MAX(period) FROM tlid_values WHERE tlid_code = v.tlid_code)
+    """
+    params = []
+    if codes:
+        sql += f" AND v.tlid_code IN ({', '.join('?' * len(codes))})"
+        params = list(codes)
+    return [dict(row) for row in conn.execute(sql + " ORDER BY v.tlid_code", params)]
+
+def series_for_code(conn, tlid_code, start_period=None, end_period=None):
+    """Every stored (period, value) for one TLID code, oldest first"""
+    sql = "SELECT period, value FROM tlid_values WHERE tlid_code = ?"
+    params = [tlid_code]
+    if start_period:
+        sql += " AND period >= ?"
+        params.append(start_period)
+    if end_period:
+        sql += " AND period <= ?"
+        params.append(end_period)
+    return [(row['period'], row['value']) for row in conn.execute(sql + " ORDER BY period", params)]
+
+def run_mapping_details(conn, source_file):
+    """Mapping statuses recorded for a processed workbook"""
+    rows = conn.execute("""
+        SELECT d.tlid_code, d.status, d.excel_row, d.data_points
+        FROM mapping_details d JOIN runs r ON r.run_id = d.run_id
+        WHERE r.source_file = ?
+        ORDER BY d.tlid_code
+    """, (source_file,))
+    return {row['tlid_code']: dict(row) for row in rows}
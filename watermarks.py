@@ -0,0 +1,80 @@
+# ---------------------------------------------------
+# PER-DATASET PERIOD WATERMARKS
+# ---------------------------------------------------
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+from config import watermark_path
+
+# Published files are named like '17-1_202504.xls': dataset '17-1', period 2025-04
+PUBLISHED_NAME_PATTERN = re.compile(r'^(?P<dataset>.+?)_(?P<year>\d{4})(?P<month>\d{2})(?: \(\d+\))?\.xlsx?$',
+                                    re.IGNORECASE)
+# Period labels as produced by the header index: '2025-04' (monthly) or '2025' (annual)
+PERIOD_LABEL_PATTERN = re.compile(r'^(?P<year>\d{4})(?:-(?P<month>\d{1,2}))?$')
+
+# ---------------------------------------------------
+# WATERMARK FUNCTIONS
+# ---------------------------------------------------
+
+def dataset_name(filename):
+    """Dataset key of a published file, e.g. '17-1' for '17-1_202504.xls'"""
+    match = PUBLISHED_NAME_PATTERN.match(os.path.basename(filename))
+    if match:
+        return match.group('dataset')
+    return os.path.splitext(os.path.basename(filename))[0].split('_')[0]
+
+def published_period(filename):
+    """Period encoded in a published file name ('2025-04'), or None"""
+    match = PUBLISHED_NAME_PATTERN.match(os.path.basename(filename))
+    if match:
+        return f"{match.group('year')}-{match.group('month')}"
+    return None
+
+def period_key(period):
+    """Sortable (year, month) of a period label; a bare year sorts after its months as (year, 13)"""
+    match = PERIOD_LABEL_PATTERN.match(str(period).strip())
+    if not match:
+        raise ValueError(f"Not a period label: {period!r}")
+    return int(match.group('year')), int(match.group('month') or 13)
+
+def load_watermarks(path=watermark_path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Ignoring unreadable watermark file {path}: {e}")
+        return {}
+
+def get_watermark(dataset, path=watermark_path):
+    """Last processed period of a dataset, or None before its first run"""
+    return load_watermarks(path).get(dataset, {}).get('period')
+
+def update_watermark(dataset, period, source_file, path=watermark_path):
+    """Advance a dataset's watermark; it never moves backwards"""
+    watermarks = load_watermarks(path)
+    current = watermarks.get(dataset, {}).get('period')
+    if period is None or (current is not None and period_key(period) <= period_key(current)):
+        return current
+
+    watermarks[dataset] = {
+        'period': period,
+        'source_file': source_file,
+        'updated': datetime.now().isoformat()
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(watermarks, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+    print(f"✓ Watermark for {dataset} advanced to {period}")
+    return period
+
+def is_published_after(filename, watermark):
+    """False only when the file name proves it holds nothing newer than the watermark"""
+    period = published_period(filename)
+    return watermark is None or period is None or period_key(period) > period_key(watermark)